@@ -16,10 +16,15 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import log
+
 # TODO: Store "prediction arrows", what nodes are predicted to become active when we
 # take this action. In order to build a MDP.
 
-class Action:
+class Action(object):
+    __slots__ = ('network', 'node', 'motor', 'triggers', 'R', 'Q', 'minQ',
+                 'maxQ', 'historySlot')
+
     def __init__(self, network, node=None, motor=None, reward=None):
         self.network = network
         self.node = node
@@ -29,24 +34,30 @@ class Action:
         self.Q = {k:0 for k in network.objectives}
         self.minQ = {k:0 for k in network.objectives}
         self.maxQ = {k:0 for k in network.objectives}
-        self.rewardHistory = []
+        self.historySlot = network.history.allocate()
         if reward: self.updateQ(reward, 0)
 
     def isAvailable(self):
         return self.node == None or self.node.isTopActive()
 
     def getName(self):
-        return motor.name
+        return self.motor.name
 
+    # The last max_reward_history rewards, oldest first
+    @property
+    def rewardHistory(self):
+        return self.network.history.last(self.historySlot)
+
+    # The key of this action in Network.actions
     def getId(self):
-        return (node.getId(), motor.name)
+        return self.network.actionId(self.node, self.motor)
 
     def updateQ(self, reward, Qsta1):
         self.triggers = self.triggers + 1
 
-        self.rewardHistory.append(reward)
-        if len(self.rewardHistory) > self.network.config.max_reward_history:
-            del self.rewardHistory[0]
+        self.network.history.append(self.historySlot, reward)
+        debug = log.action.debug
+        if debug: preQ = dict(self.Q)
 
         # Update expected reward
         reward_discount = self.network.config.reward_learning_factor
@@ -54,10 +65,8 @@ class Action:
             # TODO: keep track of max/min-R?
             self.R[objective] = (1-reward_discount) * self.R[objective] + reward_discount * r
 
-        print "... Action.updateQ", self.node.name+':'+self.motor.name, reward, Qsta1
         learning = self.network.config.q_learning_factor
         gamma = self.network.config.q_discount_factor
-        print "...... Pre-Q", self.Q
         for objective,r in reward.items():
             self.Q[objective] = self.Q[objective] + learning * (r + gamma*Qsta1.get(objective,0.0) - self.Q[objective])
             # TODO: assign directly if triggers == 0
@@ -67,7 +76,10 @@ class Action:
             else:
                 self.minQ[objective] = min(self.minQ[objective], self.Q[objective])
                 self.maxQ[objective] = max(self.maxQ[objective], self.Q[objective])
-        print "...... NEW-Q", self.Q
+        if self.network.journal: self.network.journal.updateQ(self)
+        if debug:
+            log.action.event("updateQ", node=self.node.name, motor=self.motor.name,
+                             reward=reward, Qst1a=Qsta1, preQ=preQ, Q=self.Q)
 
     def getV(self, objective=None):
         return self.R.get(objective, 0.0)
@@ -100,4 +112,65 @@ class Action:
         return "%s: %s %d" % (self.motor.name, str(self.R), self.triggers)
 
     def d(self):
-        return (self.motor.name, {'Q':self.Q, 'R':self.R, 'count':self.triggers})
+        history = self.network.history
+        return (self.motor.name, {'Q':self.Q, 'R':self.R, 'count':self.triggers,
+                                  'rewardMean':history.mean(self.historySlot),
+                                  'rewardVariance':history.variance(self.historySlot)})
+
+# Action whose values live in the network's QTable (see qtable.py) instead of
+# in its own dicts. Keeps the same interface as Action.
+class TableAction(Action):
+    __slots__ = ('table', 'row')
+
+    def __init__(self, network, node=None, motor=None, reward=None):
+        self.network = network
+        self.node = node
+        self.motor = motor
+        self.table = network.qtable
+        self.row = self.table.allocate()
+        self.historySlot = network.history.allocate()
+        if reward: self.updateQ(reward, 0)
+
+    # row is None once the node has been deleted
+    @property
+    def triggers(self):
+        assert self.row is not None, "action of a deleted node"
+        return int(self.table.triggers[self.row])
+
+    @property
+    def R(self): return self.table.get(self.table.R, self.row)
+
+    @property
+    def Q(self): return self.table.get(self.table.Q, self.row)
+
+    @property
+    def minQ(self): return self.table.get(self.table.minQ, self.row)
+
+    @property
+    def maxQ(self): return self.table.get(self.table.maxQ, self.row)
+
+    def updateQ(self, reward, Qsta1):
+        self.network.history.append(self.historySlot, reward)
+        debug = log.action.debug
+        if debug: preQ = self.Q
+
+        self.table.update([self.row], reward, Qsta1, self.network.config)
+        if self.network.journal: self.network.journal.updateQ(self)
+        if debug:
+            log.action.event("updateQ", node=self.node.name, motor=self.motor.name,
+                             reward=reward, Qst1a=Qsta1, preQ=preQ, Q=self.Q)
+
+    def getV(self, objective=None):
+        return self.table.get(self.table.R, self.row, objective)
+
+    def getR(self, objective=None):
+        return self.table.get(self.table.R, self.row, objective)
+
+    def getMinQ(self, objective=None):
+        return self.table.get(self.table.minQ, self.row, objective)
+
+    def getMaxQ(self, objective=None):
+        return self.table.get(self.table.maxQ, self.row, objective)
+
+    def getQ(self, objective=None):
+        return self.table.get(self.table.Q, self.row, objective)
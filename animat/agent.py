@@ -17,13 +17,17 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
 import itertools
 import random
 from network import *
 import environment
 import nodes
-import plotter
 import math
+import log
+from surprise import SurpriseMatrix
+from trail import Trail
+from stats import TickStats
 
 def dist(a,b):
     return math.sqrt(sum([ pow(a.get(k,0) - b.get(k,0), 2.0) for k in a.keys()]))
@@ -53,6 +57,15 @@ class AgentConfig:
     def __init__(self, conf):
         self.network = NetworkConfig(conf.get("network", {}))
         self.surprise_const = conf.get("surprise_const", 2.0)
+        # Max number of node pairs kept in each surprise matrix (None keeps
+        # them all), and the max number of pairs updated per tick (sampled
+        # when more are active).
+        self.surprise_capacity = conf.get("surprise_capacity", None)
+        self.surprise_max_pairs = conf.get("surprise_max_pairs", None)
+        # Trail entries kept in memory, older ones are moved to the output path
+        self.trail_capacity = conf.get("trail_capacity", 10000)
+        # Time the phases of every Nth tick, 0 to only keep the counters
+        self.stats_every = conf.get("stats_every", 1)
         self.wellbeeing_const = conf.get("wellbeeing_const", {})
         self.wellbeeing_function = conf.get("wellbeing_function", "min")
         self.PLOTTER_ENABLED = conf.get("PLOTTER_ENABLED", False)
@@ -73,80 +86,122 @@ class Agent:
         self.environment = environment
         self.growthRate = growthRate
         self.needs = needs or {need:1.0 for need in network.objectives}
-        self.trail = []
-        self.wellbeeingTrail = []
+        outputPath = environment.config.outputPath
+        self.trail = Trail("SS", outputPath, config.trail_capacity, "trail-")
+        self.wellbeeingTrail = Trail("d", outputPath, config.trail_capacity, "wellbeeing-")
         self._learningData = None
         self._previousTopNodes = []
-        self.surpriseMatrix = {}
-        self.surpriseMatrix_SEQ = {}
+        self.surpriseMatrix = SurpriseMatrix(config.surprise_capacity)
+        self.surpriseMatrix_SEQ = SurpriseMatrix(config.surprise_capacity)
         self._wellbeeingFunc = WELLBEEING_FUNCTIONS.get(config.wellbeeing_function)
         self.previousSensors = []
+        self._cell = None
+        self.stats = TickStats(config.stats_every)
+        if network.config.journal:
+            import journal
+            network.journal = journal.Journal(os.path.join(outputPath, "journal.bin"), network,
+                                              network.config.journal_snapshot_every)
 
     def wellbeeing(self):
         return self._wellbeeingFunc(self.needs, self.config.wellbeeing_const)
 
     # This is the main learning loop for the Animat
     def tick(self):
-        print
-        print "TICK:", self.network.time
-        print "NETWORK:", self.network.nodes.keys()
+        action = self.decide()
+        if not action: return
+        reward = self.environment.takeAction(self, action)
+        self.learn(action, reward)
+
+    # OBSERVE and DECIDE, the first half of tick. Returns the motor name to
+    # take, or None. Environments that step many agents at once (see
+    # batch.py) call decide and learn themselves.
+    def decide(self):
+        stats = self.stats
+        stats.startTick()
+        debug = log.agent.debug
+        if debug: log.agent.event("tick", time=self.network.time, nodes=self.network.nodes.keys())
 
         # OBSERVE - Read new inputs and update Activation and Status
         self.network.tick()
+        stats.lap("observe")
 
         # Check if stimuly changed from previous frame, this is used to DECIDE
         # when to propagate "previous state" for SEQ nodes.
         if self.previousSensors != self.network.activeSensors():
             self.previousSensors = self.network.activeSensors()
             self.sensorsChanged = True
-            print "SENSORS CHANGED", self.network.time
+            if debug: log.agent.event("sensorsChanged", time=self.network.time)
         else:
             self.sensorsChanged = False
 
         # Plot the network
         if self.config.PLOTTER_ENABLED:
             if self.config.PLOTTER_EVERY_FRAME or (self.network.lastChange == self.network.time-1 or self.network.time == 1):
+                import plotter # needs pygraphviz, only load it when enabled
                 plotter.plot(self.network, self.environment.config.outputPath)
+        stats.lap("plot")
 
         # Learning began last tick, follow up with the new Q.
         self._endLearning()
+        stats.lap("endLearning")
 
-        cell = self.environment.currentCell()
+        cell = self._cell = self.environment.currentCell()
 
-        print "CELL:", cell
-        print "SENSORS:", ", ".join([x.name for x in self.network.activeSensors()])
-        print "TOP:", ", ".join([x.name for x in self.network.topNodes()])
-        print "TOP ACTIVE:", ", ".join([x.name for x in self.network.activeTopNodes()])
-        print "PREVIOUS TOP ACTIVE:", ", ".join([x.name for x in self._previousTopNodes])
-        print "ALL", ", ".join(["%s=%s" % (x.getName(), x.isActive() and "ON" or "OFF") for x in self.network.allNodes()])
-        print "NEEDS:", self.needs
+        if debug:
+            log.agent.event("state", time=self.network.time, cell=cell,
+                            sensors=[x.name for x in self.network.activeSensors()],
+                            top=[x.name for x in self.network.topNodes()],
+                            topActive=[x.name for x in self.network.activeTopNodes()],
+                            previousTopActive=[x.name for x in self._previousTopNodes],
+                            active={x.getName():x.isActive() for x in self.network.allNodes()},
+                            needs=self.needs)
 
         # DECIDE - select ACTION for the node under attention that maximizes
         # expected lifespan (EXPLOIT) or tries a new state-action pair (EXPLORE)
         score,action,Q = self.network.getBestAction(self.needs)
+        stats.lap("decide")
 
 #        print "KNOWN ACTIONS:", self.network.knownActions(need)
 
-        if not action: return
-        print "BEST ACTION:", action
-
-        # take action
+        if not action: return None
+        if debug: log.agent.event("bestAction", time=self.network.time, action=action, score=score)
+        return action
+
+    # Learn from the reward of taking action, the second half of tick.
+    # Leaves the needs alone if updateNeeds is False, for environments that
+    # keep them updated themselves.
+    def learn(self, action, reward, updateNeeds=True):
+        stats = self.stats
+        stats.lap("act")
+        stats.count("actions")
+        debug = log.agent.debug
+        cell = self._cell
         prediction,numPredictions = self.network.predictR(action)
-        reward = self.environment.takeAction(self, action)
         surprise = relative_surprise(prediction, reward)
-        print ">>> SURPRISE", surprise, numPredictions, prediction, reward
+        stats.lap("surprise")
 
         self.trail.append( (cell, action) )
         self.wellbeeingTrail.append( self.wellbeeing() )
-        print ">>> reward", cell, action, reward, prediction
+        if debug:
+            log.agent.event("reward", time=self.network.time, cell=cell, action=action, reward=reward,
+                            prediction=prediction, numPredictions=numPredictions, surprise=surprise)
         self._beginLearning(surprise, reward, action, prediction, numPredictions)
+        stats.lap("learn")
 
         # update status vector
-        self._updateNeeds(reward)
+        if updateNeeds: self._updateNeeds(reward)
+        stats.lap("needs")
+
+        # Keep the network within its node budget
+        self._prune()
+        stats.lap("prune")
+
+        journal = self.network.journal
+        if journal and journal.due(self.network.time):
+            journal.snapshot(self)
 
     def mostUrgentNeed(self):
         # Get the need with the lowest value
-        print "NEEDS", self.needs
         return sorted([(v,k) for k,v in self.needs.items()])[0][1]
 
     def _updateNeeds(self, deltaNeeds):
@@ -159,35 +214,39 @@ class Agent:
                 if k != 'fear':
                     self.needs[k] = max( min(v + deltaNeeds, 1.0), 0)
 
-        print "Needs", self.needs
+        if log.agent.debug: log.agent.event("needs", time=self.network.time, needs=self.needs)
 
     def _updateSurpriseMatrix(self, surprise, reward, action, numPredictions):
         # Don't build on top of Virtual nodes
-        print "_updateSurpriseMatrix", numPredictions
         topnodes = self.network.activeTopNodes(includeVirtual=False)
 
-        for a,b in itertools.combinations(topnodes, 2):
-            pP = self.surpriseMatrix.get((a.name, b.name), reward)
-            self.surpriseMatrix[(a.name,b.name)] = averageDict( pP, reward, self.network.objectives, 0.5 )
+        time = self.network.time
+        for a,b in self._surprisePairs(itertools.combinations(topnodes, 2)):
+            pP = self.surpriseMatrix.get(a, b, reward)
+            self.surpriseMatrix.set(a, b, averageDict( pP, reward, self.network.objectives, 0.5 ), time)
+
+        for a,b in self._surprisePairs(itertools.product(self._previousTopNodes, topnodes)):
+            pP = self.surpriseMatrix_SEQ.get(a, b, reward)
+            self.surpriseMatrix_SEQ.set(a, b, averageDict( pP, reward, self.network.objectives, 0.1 ), time)
 
-        for a,b in itertools.product(self._previousTopNodes, topnodes):
-            pP = self.surpriseMatrix_SEQ.get((a.name, b.name), reward)
-            self.surpriseMatrix_SEQ[(a.name, b.name)] = averageDict( pP, reward, self.network.objectives, 0.1 )
+        self.surpriseMatrix.evict()
+        self.surpriseMatrix_SEQ.evict()
 
         # TODO: only combine with the least surprised node?
         # then we have to calculate the best action, given status, for each nodes actions
         # and then relative_surprise given the expected reward
         if surprise > self.config.surprise_const and numPredictions > 2:
+            self.stats.count("surpriseEvents")
             surprises = sorted([(relative_surprise(node.getR(action), reward), node) for node in topnodes])
-            xSurprises = sorted([(relative_surprise(v, reward), k, v) for k,v in self.surpriseMatrix.items()])
             # TODO: take the least surprised combination?
             if len(surprises) > 1 and self.config.features.get("AND", False):
-                print "XXX", surprises
                 _,a = leastSurprised = surprises[0]
                 _,b = mostSurprised = surprises[-1]
-                print "XXX most", mostSurprised
-                print "XXX least", leastSurprised
-                print "XXX xS", xSurprises
+                if log.agent.debug:
+                    log.agent.event("andCandidates", time=self.network.time,
+                                    surprises=[(s, x.name) for s,x in surprises],
+                                    pairs=[(s, (x.name, y.name)) for s,(x,y),_ in
+                                           self.surpriseMatrix.leastSurprised(lambda v: relative_surprise(v, reward), 5)])
                 # Don't add nodes with the same input, or one that shares the same forefather
                 if a == b or a.isParent(b) or b.isParent(a) or self.network.hasAndNode([a,b]):
                     pass
@@ -198,19 +257,29 @@ class Agent:
                     # Since it's not a top-active node it will not get feedback.
                     # Check this...
                     n.updateQ(action, reward, environment.makeRewardDict(0, self.needs))
-                    print ">>>> Grew a new AND-node", n.desc()
+                    self.stats.count("grownAND")
+                    if log.agent.info: log.agent.event("grow", log.INFO, time=self.network.time, kind="AND", node=n.getName())
             elif self.config.features.get("SEQ", False):
-                seqSurprises = sorted([(relative_surprise(v, reward), k) for k,v in self.surpriseMatrix_SEQ.items()])
+                seqSurprises = self.surpriseMatrix_SEQ.leastSurprised(lambda v: relative_surprise(v, reward))
                 if len(seqSurprises) > 0:
-                    a,b = seqSurprises[0][1]
-                    a,b = self.network.findNode(a), self.network.findNode(b)
-                    if seqSurprises[0][0] < 0.5 and not self.network.hasSeqNode([a,b]):
+                    s,(a,b),_ = seqSurprises[0]
+                    if s < 0.5 and not self.network.hasSeqNode([a,b]):
                         #if a.isParent(b) or b.isParent(a) or self.network.hasSeqNode([a,b]):
                         #continue
                         n = nodes.SEQNode(inputs=[a, b], virtual=False)
                         self.network.addNode(n)
                         n.updateQ(action, reward, environment.makeRewardDict(0, self.needs))
-                        print ">>>> Grew a new SEQ-node", n.desc()
+                        self.stats.count("grownSEQ")
+                        if log.agent.info: log.agent.event("grow", log.INFO, time=self.network.time, kind="SEQ", node=n.getName())
+
+    # All pairs, or a random sample of them when there are more than
+    # surprise_max_pairs.
+    def _surprisePairs(self, pairs):
+        limit = self.config.surprise_max_pairs
+        if not limit: return pairs
+        pairs = list(pairs)
+        if len(pairs) <= limit: return pairs
+        return random.sample(pairs, limit)
 
     def _beginLearning(self, surprise, reward, action, prediction, numPredictions):
         topnodes = self.network.activeTopNodes(includeVirtual=False)
@@ -230,21 +299,48 @@ class Agent:
         score,q_action,Q = self.network.getBestAction(self.needs, epsilon=0)
         Qst1a = {obj:x['weighted'] for obj,x in Q.items()}
 
-        print ">>> END LEARNING", motor, reward, Qst1a, [x.getName() for x in nodes]
+        if log.agent.debug:
+            log.agent.event("endLearning", time=self.network.time, motor=motor, reward=reward,
+                            Qst1a=Qst1a, nodes=[x.getName() for x in nodes])
 
         # Learn casuality for all active top-nodes
-        for node in nodes:
-            node.updateQ(motor, reward, Qst1a)
+        self.network.updateQ(nodes, motor, reward, Qst1a)
 
         # For SEQ-learning
         if nodes != newTopnodes:
             self._previousTopNodes = nodes
         self._learningData = None
 
-    # def _prune(self):
-    #     # TODO: Don't prune sensors or first layer nand
-    #     for n in self.network.topNodes():
-    #         if n.getAge()>100 and n.getNumActions()<2 and n.getNumTriggers()<20:
-    #             print "PRUNE", n.d()
-    #             self.network.deleteNode(n)
-    #
+    def _prune(self):
+        budget = self.network.config.max_nodes
+        if not budget or len(self.network.nodes) <= budget: return
+
+        # Nodes that are still part of learning must stay
+        protected = set(self._previousTopNodes)
+        if self._learningData:
+            protected.update(self._learningData['nodes'])
+        removed = self.network.prune(protected)
+        if not removed: return
+        self.stats.count("pruned", len(removed))
+
+        if log.agent.info:
+            log.agent.event("prune", log.INFO, time=self.network.time, nodes=[x.name for x in removed])
+        for node in removed:
+            self.surpriseMatrix.forget(node)
+            self.surpriseMatrix_SEQ.forget(node)
+
+    # Close the files the agent writes to, the trails and the journal if
+    # there is one
+    def close(self):
+        self.trail.close()
+        self.wellbeeingTrail.close()
+        if self.network.journal:
+            self.network.journal.close()
+
+    # The phase times and counters so far, see stats.py
+    def tickStats(self):
+        report = self.stats.report()
+        report['counters']['nodesEvaluated'] = self.network.evaluations
+        report['counters']['actionsScanned'] = self.network.actionsScanned
+        report['counters']['nodes'] = len(self.network.nodes)
+        return report
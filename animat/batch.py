@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy as np
+from environment import *
+
+TURNS = {'turn_right':1, 'turn_left':-1}
+NO_MOVE = -99
+
+# What an Agent in a BatchEnvironment sees as its environment
+class AgentView:
+    def __init__(self, batch, i):
+        self.batch = batch
+        self.config = batch.config
+        self.i = i
+
+    def currentCell(self, delta=(0,0)):
+        return self.batch.currentCell(self.i, delta)
+
+    def readSensor(self, x, delta=(0,0)):
+        return self.batch.readSensor(self.i, x, delta)
+
+# Runs n independent agents in the same kind of world in lockstep. Positions,
+# orientations, needs and each agent's copy of the world are kept in arrays
+# and sensing, moving, rewards and transforms are computed for all agents at
+# once. Only the networks are stepped one agent at a time, through
+# Agent.decide and Agent.learn. Dead agents are masked out.
+#
+# Agent.position and Agent.orientation are not updated and no trajectory is
+# recorded, the arrays are the state.
+class BatchEnvironment(Environment):
+    def __init__(self, config, n):
+        Environment.__init__(self, config)
+        self.n = n
+        world = config.world
+
+        # Cells are stored as indexes into config.symbols
+        self.symbols = config.symbols
+        self.code = config.symbolIndex
+
+        # One byte per cell and agent as long as the symbols fit
+        dtype = np.uint8 if len(self.symbols) <= 256 else np.intp
+        codes = np.array([self.code[x] for x in world.symbols], dtype=dtype)
+        cells = np.frombuffer(world.buffer(), dtype=np.uint8).reshape(world.height, world.width)
+        base = codes[cells]
+        self.height, self.width = base.shape
+        self.worlds = np.repeat(base[np.newaxis], n, axis=0)
+        self.positions = np.zeros((n, 2), dtype=np.intp)
+        self.orientations = np.zeros(n, dtype=np.intp)
+        self.needs = np.ones((n, len(self.objectives)))
+        self.alive = np.ones(n, dtype=bool)
+        self.agents = []
+        self._readings = []
+
+    def createAgents(self, conf):
+        self.motors = list(conf.network.motors)
+        self.sensors = list(conf.network.sensors)
+        self._compileTables()
+        self.agents = []
+        for i in range(self.n):
+            network = self._createNetwork(conf.network, i)
+            needs = {k:1 for k in self.objectives}
+            self.agents.append(Agent(conf, AgentView(self, i), network, needs, (0,0)))
+        self._sense()
+        return self.agents
+
+    def close(self):
+        for agent in self.agents:
+            agent.close()
+        Environment.close(self)
+
+    def _createNetwork(self, conf, i):
+        def makeSensor(env, i, j):
+            return lambda t: env._readings[i][j]
+        sensors = [SensorNode("$"+sensor, makeSensor(self, i, j)) for j,sensor in enumerate(self.sensors)]
+        motors = [Motor(motor) for motor in self.motors]
+        return Network(conf, sensors, motors, self.objectives)
+
+    # Sensor values, rewards, moves and transforms by cell and motor index.
+    # Rewards and transforms come from the config's tables.
+    def _compileTables(self):
+        blocks = self.config.blocks
+        self.sensorTable = np.zeros((len(self.symbols), len(self.sensors)))
+        for c, cell in enumerate(self.symbols):
+            for j, sensor in enumerate(self.sensors):
+                if sensor == 't': self.sensorTable[c, j] = 1
+                else: self.sensorTable[c, j] = blocks.get(cell, {}).get(sensor, 0)
+
+        config = self.config
+        rows = self._actionRows = [config.actionIndex[x] for x in self.motors]
+        self.rewardTable = config.rewardValues[rows]
+        self.rewardMask = config.rewardMask[rows]
+        # Cell indexes in the worlds are config.symbolIndex too
+        self.transformTable = config.transforms[rows]
+        self.moveTable = np.array([MOVES.get(x, NO_MOVE) for x in self.motors], dtype=np.intp)
+        self.turnTable = np.array([TURNS.get(x, 0) for x in self.motors], dtype=np.intp)
+        self.needsMask = np.array([k != 'fear' for k in self.objectives], dtype=bool)
+        self.orientationMatrix = np.array(ORIENTATION_MATRIX, dtype=np.intp)
+
+    def _cells(self, idx):
+        ys = self.positions[idx, 1] % self.height
+        xs = self.positions[idx, 0] % self.width
+        return self.worlds[idx, ys, xs]
+
+    def _sense(self):
+        self._readings = self.sensorTable[self._cells(np.arange(self.n))].tolist()
+
+    def currentCell(self, i, delta=(0,0)):
+        y = (self.positions[i, 1]+delta[1]) % self.height
+        x = (self.positions[i, 0]+delta[0]) % self.width
+        return self.symbols[self.worlds[i, y, x]]
+
+    def readSensor(self, i, x, delta=(0,0)):
+        if x == 't': return 1
+        return self.config.blocks.get(self.currentCell(i, delta), {}).get(x, 0)
+
+    def tick(self):
+        return self.step()
+
+    # Step every living agent once, returns the number still alive
+    def step(self):
+        idx = np.nonzero(self.alive)[0]
+        actions = {}
+        for i in idx:
+            action = self.agents[i].decide()
+            if action: actions[i] = action
+        if actions:
+            self._act(np.array(sorted(actions), dtype=np.intp), actions)
+
+        for i in idx:
+            if self.agents[i].wellbeeing() <= 0.0:
+                self.alive[i] = False
+        self._sense()
+        return int(self.alive.sum())
+
+    def _act(self, idx, actions):
+        m = np.array([self.motors.index(actions[i]) for i in idx], dtype=np.intp)
+        cells = self._cells(idx)
+        rewards = self.rewardTable[m, cells]
+        mask = self.rewardMask[m, cells]
+
+        # Moves, relative to the orientation
+        offset = self.moveTable[m]
+        moving = offset != NO_MOVE
+        d = self.orientationMatrix[(self.orientations[idx] + offset) % 8]
+        new = self.positions[idx] + d
+        if self.config.is_torus:
+            new[:,0] = new[:,0] % self.width
+            new[:,1] = new[:,1] % self.height
+        inside = (new[:,0] >= 0) & (new[:,0] < self.width) & (new[:,1] >= 0) & (new[:,1] < self.height)
+        moved = moving & inside
+        self.positions[idx[moved]] = new[moved]
+        self.orientations[idx] = (self.orientations[idx] + self.turnTable[m]) % 8
+
+        # Transforms use the cell the action was taken in, but like
+        # VirtualEnvironment.takeAction they are written where the agent is
+        # after moving.
+        trans = self.transformTable[m, cells]
+        t = trans >= 0
+        if t.any():
+            ti = idx[t]
+            ys = self.positions[ti, 1] % self.height
+            xs = self.positions[ti, 0] % self.width
+            self.worlds[ti, ys, xs] = trans[t]
+
+        for j, i in enumerate(idx):
+            reward = self.config.reward(self._actionRows[m[j]], cells[j])
+            # The other agents' decisions don't count as this one's act phase
+            self.agents[i].stats.skip()
+            self.agents[i].learn(actions[i], reward, updateNeeds=False)
+
+        # Same as Agent._updateNeeds
+        delta = np.where(mask & self.needsMask, rewards, 0.0)
+        self.needs[idx] = np.clip(self.needs[idx] + delta, 0.0, 1.0)
+        for j, i in enumerate(idx):
+            self.agents[i].needs = dict(zip(self.objectives, self.needs[i].tolist()))
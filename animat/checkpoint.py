@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import zlib
+import struct
+import random
+from array import array
+from nodes import *
+from sensor import SensorNode
+
+# Binary checkpoints of an Agent and its Network: the node graph, every
+# action's triggers/R/Q/minQ/maxQ, needs, position, the surprise matrices,
+# learning in progress, the reward histories, the cells the agent changed and
+# the RNG state.
+#
+#   checkpoint.save(agent, "trained.ckpt")
+#   cp = checkpoint.load("trained.ckpt")   # parse once
+#   for ...:
+#       agent = env.createAgent(config.agent)
+#       checkpoint.restore(agent, cp)      # then run as usual
+#
+# The file is MAGIC, a version and a zlib compressed body of arrays. Node
+# names are not stored, they follow from the kind and inputs. The trails and
+# tick statistics are not part of a checkpoint.
+
+MAGIC = "ANCP"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+
+SENSOR, AND, NAND, SEQ = range(4)
+NODE_KINDS = {SensorNode:SENSOR, AndNode:AND, NAndNode:NAND, SEQNode:SEQ}
+NODE_CLASSES = {AND:AndNode, NAND:NAndNode, SEQ:SEQNode}
+
+# Node flag bits
+VIRTUAL, PERMANENT, ACTIVE, PREVIOUS, PENDING = [1<<i for i in range(5)]
+
+class _Writer:
+    def __init__(self):
+        self.parts = []
+
+    def pack(self, fmt, *values):
+        self.parts.append(struct.pack("<" + fmt, *values))
+
+    def array(self, typecode, values):
+        a = array(typecode, values)
+        if sys.byteorder == "big": a.byteswap()
+        self.pack("I", len(a))
+        self.parts.append(a.tostring())
+
+    def string(self, s):
+        s = s.encode("utf-8")
+        self.pack("I", len(s))
+        self.parts.append(s)
+
+    def strings(self, values):
+        self.pack("I", len(values))
+        for s in values:
+            self.string(s)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        s = struct.Struct("<" + fmt)
+        values = s.unpack_from(self.data, self.offset)
+        self.offset = self.offset + s.size
+        return values
+
+    def array(self, typecode):
+        n, = self.unpack("I")
+        a = array(typecode)
+        size = n * a.itemsize
+        a.fromstring(self.data[self.offset:self.offset+size])
+        if sys.byteorder == "big": a.byteswap()
+        self.offset = self.offset + size
+        return a
+
+    def string(self):
+        n, = self.unpack("I")
+        s = self.data[self.offset:self.offset+n]
+        self.offset = self.offset + n
+        return s.decode("utf-8")
+
+    def strings(self):
+        n, = self.unpack("I")
+        return [self.string() for _ in range(n)]
+
+# A parsed checkpoint, restore() reads from it without touching the file
+class Checkpoint:
+    def __init__(self, data):
+        magic, version = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not an animat checkpoint")
+        if version != VERSION:
+            raise ValueError("Unsupported checkpoint version %d, expected %d" % (version, VERSION))
+        r = _Reader(zlib.decompress(data[HEADER.size:]))
+        self.version = version
+        self.objectives = r.strings()
+        self.motors = r.strings()
+        self.sensors = r.strings()
+
+        # Network
+        self.time, self.node_count, self.lastChange, self.evaluations, self.actionsScanned = r.unpack("iiiqq")
+        self.kinds = r.array("b")        # per id, -1 for free ids
+        self.flags = r.array("B")
+        self.numInputs = r.array("B")
+        self.inputs = r.array("i")       # flattened, in node order
+        self.counters = r.array("i")     # activations, createdAt, lastActive, time per node
+        self.topActive = r.array("i")
+        self.freeIds = r.array("i")
+        self.actionIds = r.array("i")    # actions that have been triggered
+        self.triggers = r.array("i")
+        self.values = r.array("d")       # R, Q, minQ, maxQ per objective and action
+        self.nodeHistory = self._readHistory(r)   # per id
+        self.actionHistory = self._readHistory(r) # per entry of actionIds
+
+        # Agent
+        self.needs = r.array("d")
+        self.position = r.unpack("ii")
+        self.orientation, self.sensorsChanged = r.unpack("iB")
+        self.surprise = self._readSurprise(r)
+        self.surprise_SEQ = self._readSurprise(r)
+        self.previousTopNodes = r.array("i")
+        self.previousSensors = r.array("i")
+        learning, = r.unpack("B")
+        self.learningData = None
+        if learning:
+            self.learningData = {
+                'nodes': r.array("i"),
+                'reward': dict(zip(r.strings(), r.array("d"))),
+                'action': r.string(),
+                'surprise': r.unpack("d")[0],
+                'previousTop': r.array("i"),
+            }
+        hasCell, = r.unpack("B")
+        self.cell = r.string() if hasCell else None
+        self.changes = dict(zip(r.array("i"), r.strings()))
+        version, gauss, hasGauss = r.unpack("idB")
+        self.randomState = (version, tuple(r.array("I")), gauss if hasGauss else None)
+
+    def _readSurprise(self, r):
+        return (r.array("i"), r.array("i"), r.array("i"), r.array("d"))
+
+    def _readHistory(self, r):
+        return (r.array("H"), r.array("d"))
+
+# The rewards in the history slots, oldest first: the number of rewards per
+# slot and then all of them, one value per objective (NaN when not given).
+# Slots are None for free ids.
+def _writeHistory(w, history, slots):
+    rows = [history.rows(x) if x is not None else () for x in slots]
+    w.array("H", [len(x) for x in rows])
+    w.array("d", [v for x in rows for row in x for v in row])
+
+def _setHistory(history, slots, saved, K):
+    counts, values = saved
+    offset = 0
+    for slot, n in zip(slots, counts):
+        if slot is not None and n:
+            history.setRows(slot, [values[offset+K*i:offset+K*(i+1)] for i in xrange(n)])
+        offset = offset + K*n
+
+def _writeSurprise(w, matrix, objectives):
+    entries = matrix.entries.values()
+    w.array("i", [a.n_id for a,_,_,_ in entries])
+    w.array("i", [b.n_id for _,b,_,_ in entries])
+    w.array("i", [t for _,_,_,t in entries])
+    w.array("d", [v.get(k, 0.0) for _,_,v,_ in entries for k in objectives])
+
+# values is R, Q, minQ and maxQ, each in objective order
+def actionValues(action):
+    objectives = action.network.objectives
+    values = []
+    for v in (action.R, action.Q, action.minQ, action.maxQ):
+        values.extend([v.get(k, 0.0) for k in objectives])
+    return values
+
+def setActionValues(action, triggers, values):
+    objectives = action.network.objectives
+    K = len(objectives)
+    R, Q, minQ, maxQ = [values[K*n:K*(n+1)] for n in range(4)]
+    qtable = action.network.qtable
+    if qtable is not None:
+        row = action.row
+        qtable.triggers[row] = triggers
+        qtable.R[row] = R
+        qtable.Q[row] = Q
+        qtable.minQ[row] = minQ
+        qtable.maxQ[row] = maxQ
+    else:
+        action.triggers = triggers
+        action.R = dict(zip(objectives, R))
+        action.Q = dict(zip(objectives, Q))
+        action.minQ = dict(zip(objectives, minQ))
+        action.maxQ = dict(zip(objectives, maxQ))
+
+def dumps(agent):
+    network = agent.network
+    objectives = network.objectives
+    w = _Writer()
+    w.strings(objectives)
+    w.strings([m.name for m in network.motors])
+    w.strings([s.name for s in network.sensors])
+
+    w.pack("iiiqq", network.time, network.node_count, network.lastChange,
+           network.evaluations, network.actionsScanned)
+    kinds, flags, numInputs, inputs, counters = [], [], [], [], []
+    for node in network.byId:
+        if node is None:
+            kinds.append(-1)
+            flags.append(0)
+            numInputs.append(0)
+            counters.extend((0, 0, 0, 0))
+            continue
+        kinds.append(NODE_KINDS[type(node)])
+        flags.append((node.virtual and VIRTUAL) | (node.permanent and PERMANENT) |
+                     (node.active and ACTIVE) | (node.previousActive and PREVIOUS) |
+                     (node.pendingPreviousActive and PENDING))
+        numInputs.append(len(node.inputs))
+        inputs.extend([x.n_id for x in node.inputs])
+        counters.extend((node.activations, node.createdAt, node.lastActive, node.time))
+    w.array("b", kinds)
+    w.array("B", flags)
+    w.array("B", numInputs)
+    w.array("i", inputs)
+    w.array("i", counters)
+    w.array("i", [x.n_id for x in network._topActive.values()])
+    w.array("i", network._freeIds)
+
+    # Untriggered actions still have their initial zeros, leave them out
+    actionIds, triggers, values = [], [], []
+    for actionId, action in sorted(network.actions.items()):
+        if not action.triggers: continue
+        actionIds.append(actionId)
+        triggers.append(action.triggers)
+        values.extend(actionValues(action))
+    w.array("i", actionIds)
+    w.array("i", triggers)
+    w.array("d", values)
+    _writeHistory(w, network.history, [x.historySlot if x is not None else None for x in network.byId])
+    _writeHistory(w, network.history, [network.actions[x].historySlot for x in actionIds])
+
+    w.array("d", [agent.needs[k] for k in objectives])
+    w.pack("ii", *agent.position)
+    w.pack("iB", agent.orientation, getattr(agent, "sensorsChanged", False))
+    _writeSurprise(w, agent.surpriseMatrix, objectives)
+    _writeSurprise(w, agent.surpriseMatrix_SEQ, objectives)
+    w.array("i", [x.n_id for x in agent._previousTopNodes])
+    w.array("i", [x.n_id for x in agent.previousSensors])
+    learning = agent._learningData
+    w.pack("B", learning is not None)
+    if learning is not None:
+        w.array("i", [x.n_id for x in learning['nodes']])
+        w.strings(learning['reward'].keys())
+        w.array("d", learning['reward'].values())
+        w.string(learning['action'])
+        w.pack("d", learning['surprise'])
+        w.array("i", [x.n_id for x in learning['previousTop']])
+    w.pack("B", agent._cell is not None)
+    if agent._cell is not None: w.string(agent._cell)
+    world = getattr(agent.environment, "world", None)
+    changes = sorted(getattr(world, "changes", {}).items())
+    w.array("i", [i for i,_ in changes])
+    w.strings([x for _,x in changes])
+    version, state, gauss = random.getstate()
+    w.pack("idB", version, gauss or 0.0, gauss is not None)
+    w.array("I", state)
+
+    return HEADER.pack(MAGIC, VERSION) + zlib.compress(w.getvalue(), 6)
+
+def loads(data):
+    return Checkpoint(data)
+
+def save(agent, path):
+    fp = open(path, "wb")
+    fp.write(dumps(agent))
+    fp.close()
+
+def load(path):
+    fp = open(path, "rb")
+    data = fp.read()
+    fp.close()
+    return Checkpoint(data)
+
+# Put the state of checkpoint cp into agent, a freshly created agent of the
+# same configuration (sensors, motors and objectives must match). The random
+# module is reseeded from the checkpoint unless restoreRandom is False.
+def restore(agent, cp, restoreRandom=True):
+    network = agent.network
+    objectives = network.objectives
+    if (list(objectives) != cp.objectives or [m.name for m in network.motors] != cp.motors
+            or [s.name for s in network.sensors] != cp.sensors):
+        raise ValueError("Checkpoint doesn't match the agent's sensors, motors or objectives")
+    if len(network.nodes) != len(network.sensors):
+        raise ValueError("Can only restore into a new agent")
+
+    # The restored state is journaled as a snapshot, not node by node
+    journal = network.journal
+    network.journal = None
+
+    # Rebuild the graph. Reused ids mean a node can have a higher id than its
+    # inputs, so inputs are added first. Each node is given its id by
+    # offering addNode only that one as free.
+    byId = network.byId
+    sensors = len(network.sensors)
+    for i in xrange(sensors):
+        if cp.kinds[i] != SENSOR:
+            raise ValueError("Node %d should be a sensor" % i)
+    n = len(cp.kinds)
+    starts = [0] * (n+1)
+    for i in xrange(n):
+        starts[i+1] = starts[i] + cp.numInputs[i]
+    for ids in (byId, network.inputIds, network.outputIds):
+        ids.extend([None] * (n - len(ids)))
+    for i in xrange(sensors, n):
+        stack = [i]
+        while stack:
+            j = stack[-1]
+            if byId[j] is not None or cp.kinds[j] < 0:
+                stack.pop()
+                continue
+            inputs = cp.inputs[starts[j]:starts[j+1]]
+            missing = [x for x in inputs if byId[x] is None]
+            if missing:
+                if cp.kinds[missing[0]] < 0 or len(stack) > n:
+                    raise ValueError("Corrupt checkpoint, node %d has a bad input" % j)
+                stack.extend(missing)
+                continue
+            stack.pop()
+            node = NODE_CLASSES[cp.kinds[j]](inputs=[byId[x] for x in inputs], permanent=bool(cp.flags[j] & PERMANENT))
+            node.virtual = bool(cp.flags[j] & VIRTUAL)
+            network._freeIds = [j]
+            network.addNode(node)
+    for i in xrange(n):
+        node = byId[i]
+        if node is None: continue
+        flags = cp.flags[i]
+        node.active = bool(flags & ACTIVE)
+        node.previousActive = bool(flags & PREVIOUS)
+        node.pendingPreviousActive = bool(flags & PENDING)
+        node.activations, node.createdAt, node.lastActive, node.time = cp.counters[4*i:4*i+4]
+    network._freeIds = list(cp.freeIds)
+
+    # Action values
+    actions = network.actions
+    K = len(objectives)
+    for j, actionId in enumerate(cp.actionIds):
+        action = actions[actionId]
+        base = 4*K*j
+        setActionValues(action, cp.triggers[j], cp.values[base:base+4*K])
+    _setHistory(network.history, [x.historySlot if x is not None else None for x in byId], cp.nodeHistory, K)
+    _setHistory(network.history, [actions[x].historySlot for x in cp.actionIds], cp.actionHistory, K)
+
+    # Network state and indexes
+    network.time = cp.time
+    network.node_count = cp.node_count
+    network.evaluations = cp.evaluations
+    network.actionsScanned = cp.actionsScanned
+    nodes = network.nodes.values()
+    network._activeSensors = [x for x in network.sensors if x.active]
+    network._setTopActive([byId[x] for x in cp.topActive])
+    network._activeNodes = set([x for x in nodes if x.active])
+    network._pendingChanged = set([x for x in nodes if x.pendingPreviousActive != x.previousActive])
+    network._lastEvaluated = set(nodes)
+    network._dirty = set(nodes) if network._incremental else set()
+    network._compiled = None
+    network.lastChange = cp.lastChange
+
+    # Agent
+    agent.needs = dict(zip(objectives, cp.needs))
+    agent.position = tuple(cp.position)
+    agent.orientation = cp.orientation
+    agent.sensorsChanged = bool(cp.sensorsChanged)
+    for matrix, (a, b, times, values) in ((agent.surpriseMatrix, cp.surprise),
+                                          (agent.surpriseMatrix_SEQ, cp.surprise_SEQ)):
+        for j in xrange(len(a)):
+            matrix.set(byId[a[j]], byId[b[j]], dict(zip(objectives, values[K*j:K*(j+1)])), times[j])
+    agent._previousTopNodes = [byId[x] for x in cp.previousTopNodes]
+    agent.previousSensors = [byId[x] for x in cp.previousSensors]
+    agent._learningData = None
+    if cp.learningData:
+        learning = cp.learningData
+        agent._learningData = {
+            'nodes': [byId[x] for x in learning['nodes']],
+            'reward': dict(learning['reward']),
+            'action': learning['action'],
+            'surprise': learning['surprise'],
+            'previousTop': [byId[x] for x in learning['previousTop']],
+        }
+    agent._cell = cp.cell
+    if hasattr(agent.environment, "setChanges"):
+        agent.environment.setChanges(cp.changes)
+    if restoreRandom:
+        random.setstate(cp.randomState)
+    network.journal = journal
+    if journal: journal.snapshot(agent)
+    return agent
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import itertools
+import numpy as np
+from nodes import *
+from sensor import *
+
+AND, NAND, SEQ, OFF = range(4)
+
+# A levelized, array based copy of a Network. Node i in self.nodes has its
+# state at index i of the boolean arrays, index n is a constant True used to
+# pad the input lists. Each level is evaluated as a few numpy operations
+# instead of one Python call per node.
+class CompiledNetwork:
+    def __init__(self, network):
+        self.lastChange = network.lastChange
+        nodes = sorted(network.nodes.values(), key=lambda x: (x.level, x.n_id))
+        n = len(nodes)
+        index = {node:i for i,node in enumerate(nodes)}
+        self.nodes = nodes
+        self.n = n
+
+        self.active = np.array([x.active for x in nodes] + [True], dtype=bool)
+        self.pending = np.array([x.pendingPreviousActive for x in nodes] + [True], dtype=bool)
+        self.previous = np.array([x.previousActive for x in nodes] + [True], dtype=bool)
+        self.activations = np.array([x.activations for x in nodes] + [0], dtype=np.int64)
+        self.topActive = np.array([x.topActive for x in nodes] + [False], dtype=bool)
+
+        self._sensorNodes = [x for x in network.sensors if x in index]
+        self.sensors = np.array([index[x] for x in self._sensorNodes], dtype=np.intp)
+        isSensor = np.zeros(n+1, dtype=bool)
+        isSensor[self.sensors] = True
+        self.evaluated = np.nonzero(~isSensor[:n])[0]
+
+        # Only sensors and real nodes on top of something reachable take part
+        # in the top-active search, see Network._updateReachable.
+        self.reachable = np.zeros(n+1, dtype=bool)
+        for node in nodes:
+            i = index[node]
+            if isSensor[i]:
+                self.reachable[i] = True
+            elif not node.virtual:
+                self.reachable[i] = any([self.reachable[index[x]] for x in node.inputs])
+
+        self.layers = []
+        self.edges = []
+        for level, group in itertools.groupby(nodes, key=lambda x: x.level):
+            group = [x for x in group if not isSensor[index[x]]]
+            kinds = {}
+            for node in group:
+                kinds.setdefault(self._kind(node), []).append(node)
+            ops = []
+            for kind, members in sorted(kinds.items()):
+                idx = np.array([index[x] for x in members], dtype=np.intp)
+                width = max([len(x.inputs) for x in members] + [1])
+                inputs = np.array([[index[i] for i in x.inputs] + [n]*(width-len(x.inputs)) for x in members], dtype=np.intp)
+                nonempty = np.array([len(x.inputs) > 0 for x in members], dtype=bool)
+                ops.append((kind, idx, inputs, nonempty))
+            self.layers.append(ops)
+
+            # input => node edges where the node is a real output of its input
+            src = [index[i] for x in group if not x.virtual for i in x.inputs]
+            dst = [index[x] for x in group if not x.virtual for i in x.inputs]
+            if src:
+                self.edges.append((np.array(src, dtype=np.intp), np.array(dst, dtype=np.intp)))
+        self.edges.reverse()
+
+        self._written = {}
+        self._remember()
+
+    def _kind(self, node):
+        if isinstance(node, AndNode): return AND
+        if isinstance(node, NAndNode): return NAND
+        if isinstance(node, SEQNode):
+            if len(node.inputs) > 1: return SEQ
+            else: return OFF
+        raise TypeError("Can't compile node %s" % node.getName())
+
+    def _remember(self):
+        for attr in ('active', 'pending', 'previous', 'topActive'):
+            self._written[attr] = getattr(self, attr).copy()
+
+    # Same as Network.tick after the sensors have been ticked: copy
+    # previousActive if the sensors changed, evaluate every level and find
+    # the top-active nodes.
+    def tick(self, sensorsChanged):
+        sensors = self.sensors
+        self.active[sensors] = [x.active for x in self._sensorNodes]
+        self.pending[sensors] = [x.pendingPreviousActive for x in self._sensorNodes]
+        self.activations[sensors] = [x.activations for x in self._sensorNodes]
+        if sensorsChanged:
+            self.previous[:] = self.pending
+
+        active = self.active
+        for ops in self.layers:
+            for kind, idx, inputs, nonempty in ops:
+                self.pending[idx] = active[idx]
+                if kind == AND:
+                    active[idx] = active[inputs].all(axis=1) & nonempty
+                elif kind == NAND:
+                    active[idx] = ~(active[inputs].all(axis=1) & nonempty)
+                elif kind == SEQ:
+                    active[idx] = self.previous[inputs[:,0]] & active[inputs[:,1]]
+                else:
+                    active[idx] = False
+        self.activations[self.evaluated] += active[self.evaluated]
+
+        # found[i] is True when a real output of i, or something above it,
+        # is active. Outputs always sit on a higher level than their inputs.
+        found = np.zeros(self.n+1, dtype=bool)
+        for src, dst in self.edges:
+            above = active[dst] | found[dst]
+            found[src[above]] = True
+        self.topActive = active & ~found & self.reachable
+
+    # Copy the compiled state back onto the node objects, only touching what
+    # changed. Returns the top-active nodes.
+    def writeBack(self, time):
+        nodes = self.nodes
+        for attr, name in (('active', 'active'), ('pending', 'pendingPreviousActive'), ('previous', 'previousActive')):
+            values = getattr(self, attr)
+            for i in np.nonzero(values[:self.n] != self._written[attr][:self.n])[0]:
+                setattr(nodes[i], name, bool(values[i]))
+        for i in np.nonzero(self.active[:self.n])[0]:
+            node = nodes[i]
+            node.activations = int(self.activations[i])
+            node.time = time
+            node.lastActive = time
+        self._remember()
+        return [nodes[i] for i in np.nonzero(self.topActive[:self.n])[0]]
+
+    # Names of nodes whose active/topActive differs from the object graph
+    def mismatches(self):
+        result = []
+        for i, node in enumerate(self.nodes):
+            if node.active != self.active[i] or node.topActive != self.topActive[i]:
+                result.append(node.getName())
+        return result
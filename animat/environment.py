@@ -18,9 +18,14 @@
 #
 
 import os, os.path
+import errno
 import datetime
 import itertools
 import random
+import numpy as np
+import log
+import gridworld
+import trajectory
 from network import *
 from agent import *
 from sensor import *
@@ -40,9 +45,10 @@ def createPath(path):
 
 
 class EnvironmentConfig:
-    def __init__(self, conf):
+    def __init__(self, conf, outputPath=None):
 #        worldmap = "rrrrrrrrrr\ngggggggggg\n0000000000\nbbbbbbbbbb\nxxxxxxxxxx"
-        self.world = [list(x) for x in conf.get("world").split("\n")]
+        # A GridWorld, from "world_file" or the "world" string
+        self.world = gridworld.fromConfig(conf)
         self.is_torus = conf.get("torus", False)
         self.enable_playback = conf.get("playback", False)
         self.objectives = conf.get("objectives", ["water", "glucose"])
@@ -51,46 +57,88 @@ class EnvironmentConfig:
         self.agent = AgentConfig(conf.get("agent"))
         self.maxIterations = conf.get("iterations", 100)
         self.transform = conf.get("transform", {})
-        self.outputPath = os.path.join('output', datetime.datetime.now().isoformat())
+        # Structured logging, see log.configure. Off when not given.
+        self.log = conf.get("log", None)
+        self.outputPath = outputPath or os.path.join('output', datetime.datetime.now().isoformat())
         createPath(self.outputPath)
+        self._compileTables()
+
+    # Rewards and transforms by action index and cell index, with the '*'
+    # fallbacks resolved:
+    #
+    #   rewards[a][c]       reward dict, shared, see reward()
+    #   rewardValues[a,c]   the same in objective order (0 if unset), numpy
+    #   rewardMask[a,c]     which objectives the reward has, numpy bool
+    #   transforms[a,c]     index of the cell it turns into, or -1, numpy
+    #
+    # Actions are the agent's motors and the actions named in rewards and
+    # transform, cells are every symbol the world can hold.
+    def _compileTables(self):
+        actions = list(self.agent.network.motors)
+        for x in self.rewardMatrix.keys() + self.transform.keys():
+            if x != '*' and x not in actions: actions.append(x)
+        symbols = set(self.world.symbols)
+        symbols.update(self.blocks.keys())
+        for am in self.rewardMatrix.values():
+            symbols.update(am.keys())
+        for tm in self.transform.values():
+            symbols.update(tm.keys())
+            symbols.update(tm.values())
+        symbols.discard('*')
+        self.actions = actions
+        self.symbols = sorted(symbols)
+        self.actionIndex = {x:i for i,x in enumerate(self.actions)}
+        self.symbolIndex = {x:i for i,x in enumerate(self.symbols)}
+
+        status = {k:0 for k in self.objectives}
+        self.rewards = [[self.resolveReward(action, cell, status) for cell in self.symbols] for action in self.actions]
+        self.rewardValues = np.array([[[float(r.get(k, 0.0)) for k in self.objectives] for r in rewards]
+                                      for rewards in self.rewards]).reshape(len(self.actions), len(self.symbols), len(self.objectives))
+        self.rewardMask = np.array([[[k in r for k in self.objectives] for r in rewards]
+                                    for rewards in self.rewards], dtype=bool).reshape(self.rewardValues.shape)
+        transforms = [[self.resolveTransform(action, cell) for cell in self.symbols] for action in self.actions]
+        self.transforms = np.array([[self.symbolIndex[x] if x else -1 for x in row] for row in transforms],
+                                   dtype=np.intp).reshape(len(self.actions), len(self.symbols))
+
+    # A copy of rewards[a][c], for the agent to keep or change
+    def reward(self, a, c):
+        return dict(self.rewards[a][c])
+
+    def resolveReward(self, action, cell, status):
+        rm = self.rewardMatrix
+        am = rm.get(action, rm.get('*',{}))
+        r = am.get(cell, am.get('*',0.0))
+        return makeRewardDict(r, status)
+
+    def resolveTransform(self, action, cell):
+        return self.transform.get(action,{}).get(cell, None)
 
 class Environment:
     def __init__(self, config=None, objectives=None, agent=None):
         self.config = config
         self.agent = agent
         self.objectives = objectives or config.objectives
+        if self.config.log:
+            log.configure(self.config.log, self.config.outputPath)
+        # Binary log of every action, export with playback.py
+        self.trajectory = None
         if self.config.enable_playback:
-            self.playback = open( os.path.join(config.outputPath, "playback_script.py"), "w")
-            print >> self.playback, "import turtle;t = turtle.Turtle()"
+            self.trajectory = trajectory.Recorder(os.path.join(config.outputPath, "trajectory.bin"),
+                                                  self.objectives, config.actions, config.symbols)
 
-    def _playback(self, agent, action, nx=0, ny=0):
-        if self.config.enable_playback:
-            if action == 'up' or action == 'down' or action == 'right' or action == 'left':
-                x,y = agent.position
-                wrap = False
-                if abs(nx-x) > 1 or abs(ny-y) > 1:
-                    wrap = True
-                if wrap: print >> self.playback, "t.color((1,0,0));t.dot(3);t.penup()"
-                if self.config.is_torus:
-                    nx = nx%self.getWidth()
-                    ny = ny%self.getHeight()
-                print >> self.playback, "t.setpos(%d,%d)" % (nx*10, ny*10)
-                if wrap: print >> self.playback, "t.pendown();t.color((1,1,0));t.dot(3);t.color((0,0,0))"
-            elif action == 'turn_right':
-                print >> self.playback, "t.right(90)"
-            elif action == 'turn_left':
-                print >> self.playback, "t.left(90)"
-            elif action == 'eat':
-                print >> self.playback, "t.color((0,1,0));t.dot(5);t.color((0,0,0))"
-            elif action == 'drink':
-                print >> self.playback, "t.color((0,0,1));t.dot(5);t.color((0,0,0))"
+    # Close the files the environment and its agent write to: the trajectory
+    # if recorded, the agent's trails and journal
+    def close(self):
+        if self.agent:
+            self.agent.close()
+        if self.trajectory:
+            self.trajectory.close()
 
     def setAgent(self, agent):
         self.agent = agent
         agent.setEnvironment(self)
 
     def tick(self):
-        print "tick"
         self.agent.tick()
 
     def takeAction(self, agent, action):
@@ -102,26 +150,101 @@ class Environment:
     def createAgent(self):
         return None
 
+# Direction index into ORIENTATION_MATRIX of each move, relative to the
+# agent's orientation.
+#
+# Moves are computed, not looked up in a precomputed neighbour table. A table
+# of the neighbour of every cell in each of the 8 directions takes 32 bytes
+# per cell and O(cells) to build, and on a 2000x2000 world reading it was
+# slower than the modulo arithmetic in move_agent.
+MOVES = {'up':0, 'down':4, 'left':-2, 'right':2}
+
+# Smallest unsigned type that holds a bitmask of n sensors
+def maskType(n):
+    for bits, dtype in ((8, np.uint8), (16, np.uint16), (32, np.uint32), (64, np.uint64)):
+        if n <= bits: return dtype
+    return object
+
 class VirtualEnvironment(Environment):
     def __init__(self, config):
         Environment.__init__(self, config)
-        self.world = config.world
+        self.sensors = []
+        # The config's world is shared and never written to, the cells
+        # transforms change are kept in an overlay.
+        self.world = gridworld.Overlay(config.world)
+        self.height = self.world.height
+        self.width = self.world.width
+        self._maskPosition = None
+        self._cellMasks = {}
+        # The sensor bitmask of every cell, see _buildMasks
+        self._masks = None
+
+    # Undo every change to the world, in time proportional to their number
+    def reset(self):
+        changed = list(self.world.changes)
+        self.world.reset()
+        self._patchMasks(changed)
+
+    # Replace the changes to the world, cell index => symbol
+    def setChanges(self, changes):
+        changed = list(self.world.changes)
+        self.world.setChanges(changes)
+        self._patchMasks(changed + list(self.world.changes))
+
+    # The sensor readings of a kind of cell as a bitmask, bit j set when
+    # sensor j is on. All sensors are read with one lookup per tick.
+    def _cellMask(self, cell):
+        mask = self._cellMasks.get(cell)
+        if mask is None:
+            observation = self.config.blocks.get(cell, {})
+            mask = 0
+            for j, sensor in enumerate(self.sensors):
+                if sensor == 't' or observation.get(sensor, 0):
+                    mask = mask | (1 << j)
+            self._cellMasks[cell] = mask
+        return mask
+
+    # Compile blocks x world into one sensor bitmask per cell, in the
+    # smallest type that holds all sensors (one byte for up to 8). Built
+    # once the network's sensors are known, then only the cells that
+    # change are patched.
+    def _buildMasks(self):
+        base = self.world.base
+        table = np.array([self._cellMask(x) for x in base.symbols], dtype=maskType(len(self.sensors)))
+        self._masks = table[np.frombuffer(base.buffer(), dtype=np.uint8)]
+        self._patchMasks(self.world.changes)
+
+    def _patchMasks(self, cells):
+        self._maskPosition = None
+        if self._masks is None: return
+        for i in cells:
+            self._masks[i] = self._cellMask(self.world.cell(i))
+
+    def _index(self, position):
+        return (position[1] % self.height) * self.width + position[0] % self.width
+
+    # The sensor bitmask of the agent's cell, looked up once per position
+    def sensorMask(self):
+        position = self.agent.position
+        if position != self._maskPosition:
+            self._maskPosition = position
+            self._mask = int(self._masks[self._index(position)])
+        return self._mask
 
     def getHeight(self):
-        return len(self.world)
+        return self.height
 
     def getWidth(self):
-        return len(self.world[0])
+        return self.width
 
     def currentCell(self,delta=(0,0)):
-        y = (self.agent.position[1]+delta[1]) % len(self.world)
-        x = (self.agent.position[0]+delta[0]) % len(self.world[y])
-        return self.world[y][x]
+        position = self.agent.position
+        return self.world.cell(self._index((position[0]+delta[0], position[1]+delta[1])))
 
     def setCurrentCell(self, v):
-        y = self.agent.position[1] % len(self.world)
-        x = self.agent.position[0] % len(self.world[y])
-        self.world[y][x] = v
+        i = self._index(self.agent.position)
+        self.world.set(i, v)
+        self._patchMasks([i])
 
     def readSensor(self, x, delta=(0,0)):
         if x == 't': return 1
@@ -131,9 +254,12 @@ class VirtualEnvironment(Environment):
 
     # Create a basic network that supports this environment
     def createNetwork(self, conf):
-        def makeSensor(env, cell, delta=(0,0)):
-            return lambda t: env.readSensor(cell, delta)
-        sensors = [SensorNode("$"+sensor, makeSensor(self, sensor)) for sensor in conf.sensors]
+        self.sensors = list(conf.sensors)
+        self._cellMasks = {}
+        self._buildMasks()
+        def makeSensor(env, bit):
+            return lambda t: env.sensorMask() & bit
+        sensors = [SensorNode("$"+sensor, makeSensor(self, 1 << j)) for j, sensor in enumerate(conf.sensors)]
         motors = [Motor(motor) for motor in conf.motors] #, 'wait']]
         return Network(conf, sensors, motors, self.objectives)
 
@@ -141,18 +267,20 @@ class VirtualEnvironment(Environment):
         self.agent = Agent(conf, self, self.createNetwork(conf.network), {k:1 for k in self.objectives}, (0,0))
         return self.agent
 
-    def _getReward(self, action, cell, status):
-        rm = self.config.rewardMatrix
-        am = rm.get(action, rm.get('*',{}))
-        r = am.get(cell, am.get('*',0.0))
-        reward = makeRewardDict(r, status)
-        # TODO: truncate reward if need is satisfied
-        return reward
-
     def takeAction(self, agent, action):
         cell = self.currentCell()
-        reward = self._getReward(action, cell, agent.needs)
-        print "POSITION", agent.position, action
+        config = self.config
+        a = config.actionIndex.get(action)
+        c = config.symbolIndex.get(cell)
+        if a is None or c is None:
+            reward = config.resolveReward(action, cell, agent.needs)
+            trans = config.resolveTransform(action, cell)
+        else:
+            reward = config.reward(a, c)
+            t = config.transforms[a, c]
+            trans = config.symbols[t] if t >= 0 else None
+        if log.environment.debug:
+            log.environment.event("takeAction", position=agent.position, action=action, cell=cell)
 
         def move_agent(agent, dx, dy):
 #            print "PP MOVE", agent.position, dx, dy
@@ -161,41 +289,28 @@ class VirtualEnvironment(Environment):
             if self.config.is_torus:
                 nx = nx%self.getWidth()
                 ny = ny%self.getHeight()
-            self._playback(agent, action, nx, ny)
             if nx >= 0 and nx < self.getWidth() and ny >= 0 and ny < self.getHeight():
                 agent.position = (nx, ny)
 #            print "PP NEW", agent.position
 
-        if action == 'up':
-            dx,dy = ORIENTATION_MATRIX[agent.orientation%8]
-            move_agent(agent, dx, dy)
-        elif action == 'down':
-            dx,dy = ORIENTATION_MATRIX[(agent.orientation+4)%8]
-            move_agent(agent, dx, dy)
-        elif action == 'left':
-            dx,dy = ORIENTATION_MATRIX[(agent.orientation-2)%8]
-            move_agent(agent, dx, dy)
-        elif action == 'right':
-            dx,dy = ORIENTATION_MATRIX[(agent.orientation+2)%8]
+        move = MOVES.get(action)
+        if move is not None:
+            dx,dy = ORIENTATION_MATRIX[(agent.orientation+move)%8]
             move_agent(agent, dx, dy)
         elif action == 'turn_right':
             agent.orientation = (agent.orientation+1)%8
-            self._playback(agent, action)
         elif action == 'turn_left':
             agent.orientation = (agent.orientation-1)%8
-            self._playback(agent, action)
-        elif action == 'eat':
-            self._playback(agent, action)
-        elif action == 'drink':
-            self._playback(agent, action)
 
-        trans = self.config.transform.get(action,{}).get(cell, None)
         if trans:
-            print "*** TRANSFORM", action, cell, trans
+            if log.environment.info:
+                log.environment.event("transform", log.INFO, position=agent.position, action=action, cell=cell, to=trans)
             self.setCurrentCell(trans)
 
+        if self.trajectory:
+            self.trajectory.record(agent.network.time, agent, action, cell, reward)
         return reward
 
     def printWorld(self):
-        for row in self.world:
+        for row in self.world.rows():
             print row
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import mmap
+import struct
+
+# A rectangular world stored as one byte per cell, the index of the cell's
+# symbol in GridWorld.symbols. The bytes live in an mmap: a read-only
+# mapping of a grid file, or anonymous shared memory for worlds given as a
+# string in the config. Either way processes forked after the world is
+# loaded (see preload) share a single copy. Nothing writes to a GridWorld,
+# environments keep their changes to it on the side.
+#
+# Grid file: HEADER, the symbols as length-prefixed utf-8 strings, then
+# width*height cell bytes row by row. Write one with save().
+
+MAGIC = "ANGW"
+VERSION = 1
+HEADER = struct.Struct("<4sHIIH") # magic, version, width, height, symbols
+
+class GridWorld:
+    def __init__(self, width, height, symbols, cells, offset=0):
+        self.width = width
+        self.height = height
+        self.symbols = list(symbols)
+        self.cells = cells
+        self.offset = offset # of the first cell in cells
+        self._symbolOf = {chr(i):x for i,x in enumerate(self.symbols)}
+        self._codes = {x:i for i,x in enumerate(self.symbols)}
+
+    def __len__(self):
+        return self.height
+
+    # The symbol of cell i, i = y*width+x
+    def cell(self, i):
+        return self._symbolOf[self.cells[self.offset+i]]
+
+    def get(self, x, y):
+        return self.cell(y*self.width + x)
+
+    def code(self, symbol):
+        return self._codes[symbol]
+
+    def row(self, y):
+        start = self.offset + y*self.width
+        return [self._symbolOf[c] for c in self.cells[start:start+self.width]]
+
+    def rows(self):
+        return [self.row(y) for y in xrange(self.height)]
+
+    # The cell bytes, for numpy.frombuffer
+    def buffer(self):
+        return buffer(self.cells, self.offset, self.width*self.height)
+
+# Copy-on-write view of a GridWorld for one episode. Writes go into a dict
+# of cell index => symbol, holding only the cells that differ from the base,
+# so resetting and exporting cost as much as the number of changed cells.
+class Overlay:
+    def __init__(self, base):
+        self.base = base
+        self.width = base.width
+        self.height = base.height
+        self.changes = {}
+
+    def __len__(self):
+        return self.height
+
+    def cell(self, i):
+        cell = self.changes.get(i)
+        if cell is None: return self.base.cell(i)
+        return cell
+
+    def get(self, x, y):
+        return self.cell(y*self.width + x)
+
+    def set(self, i, cell):
+        if cell == self.base.cell(i):
+            self.changes.pop(i, None)
+        else:
+            self.changes[i] = cell
+
+    def row(self, y):
+        return [self.cell(y*self.width + x) for x in xrange(self.width)]
+
+    def rows(self):
+        return [self.row(y) for y in xrange(self.height)]
+
+    # Back to the base world
+    def reset(self):
+        self.changes = {}
+
+    def setChanges(self, changes):
+        self.reset()
+        for i, cell in changes.items():
+            self.set(i, cell)
+
+    # The changed cells as (x, y, base cell, cell), row by row
+    def diff(self):
+        return [(i % self.width, i // self.width, self.base.cell(i), cell) for i, cell in sorted(self.changes.items())]
+
+    def writeDiff(self, path):
+        fp = open(path, "w")
+        print >> fp, "x;y;before;after"
+        for x, y, before, after in self.diff():
+            print >> fp, (u"%d;%d;%s;%s" % (x, y, before, after)).encode("utf-8")
+        fp.close()
+
+# Cell given to the missing end of rows shorter than the widest row
+FILLER = " "
+
+# A GridWorld of a list of strings (or lists of symbols), in anonymous shared
+# memory. Empty rows at the end, e.g. from a trailing newline, are left out
+# and shorter rows are padded with FILLER to the widest one. Cells are stored
+# in one byte, so a world can have at most 256 different cells.
+def fromRows(rows):
+    rows = list(rows)
+    while rows and len(rows[-1]) == 0:
+        rows.pop()
+    height = len(rows)
+    width = max([len(row) for row in rows]) if rows else 0
+    if width == 0:
+        raise ValueError("The world is empty")
+    rows = [row if len(row) == width else list(row) + [FILLER] * (width - len(row)) for row in rows]
+    symbols = set()
+    for row in rows:
+        symbols.update(row)
+    symbols = sorted(symbols)
+    if len(symbols) > 256:
+        raise ValueError("A world can have at most 256 different cells")
+    codes = {x:chr(i) for i,x in enumerate(symbols)}
+    table = {ord(x):unichr(i) for i,x in enumerate(symbols) if len(x) == 1}
+    cells = mmap.mmap(-1, width*height)
+    for row in rows:
+        if isinstance(row, basestring) and len(table) == len(symbols):
+            cells.write(unicode(row).translate(table).encode("latin-1"))
+        else:
+            cells.write("".join([codes[x] for x in row]))
+    return GridWorld(width, height, symbols, cells)
+
+def save(path, world):
+    if not isinstance(world, GridWorld):
+        world = fromRows(world)
+    fp = open(path, "wb")
+    fp.write(HEADER.pack(MAGIC, VERSION, world.width, world.height, len(world.symbols)))
+    for x in world.symbols:
+        x = x.encode("utf-8")
+        fp.write(struct.pack("<H", len(x)) + x)
+    fp.write(str(world.buffer()))
+    fp.close()
+
+# Map a grid file read-only
+def load(path):
+    fp = open(path, "rb")
+    try:
+        cells = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        fp.close()
+    magic, version, width, height, n = HEADER.unpack_from(cells)
+    if magic != MAGIC:
+        raise ValueError("%s is not a grid world file" % path)
+    if version > VERSION:
+        raise ValueError("Unsupported grid world version %d, expected at most %d" % (version, VERSION))
+    offset = HEADER.size
+    symbols = []
+    for _ in xrange(n):
+        size, = struct.unpack_from("<H", cells, offset)
+        symbols.append(cells[offset+2:offset+2+size].decode("utf-8"))
+        offset = offset + 2 + size
+    if len(cells) - offset < width*height:
+        raise ValueError("%s is truncated" % path)
+    return GridWorld(width, height, symbols, cells, offset)
+
+# Worlds loaded by this process, so configs with the same world share it
+_loaded = {}
+
+def _key(conf):
+    if conf.get("world_file"):
+        return ("file", os.path.abspath(conf["world_file"]))
+    world = conf.get("world")
+    return ("string", len(world), hash(world))
+
+# The world of an environment config, from "world_file" if given, else the
+# "world" string. Loaded once per process.
+def fromConfig(conf):
+    key = _key(conf)
+    entry = _loaded.get(key)
+    if entry is not None and (key[0] == "file" or entry[0] == conf.get("world")):
+        return entry[1]
+    if key[0] == "file":
+        world = load(conf["world_file"])
+    else:
+        world = fromRows(conf.get("world").split("\n"))
+    _loaded[key] = (conf.get("world"), world)
+    return world
+
+# Load the world of conf now, so processes forked from here on find it
+# already in memory instead of loading their own copy.
+def preload(conf):
+    fromConfig(conf)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy as np
+
+NAN = float('nan')
+
+# The last `length` rewards of every node and action in a network. Each owner
+# has a slot, a ring buffer of `length` rows in one preallocated array of
+# slots x length x objectives, plus the position of its next write and how
+# many rows are in use. Objectives missing from a reward are stored as NaN,
+# the summaries skip them.
+class RewardHistory:
+    def __init__(self, objectives, length, capacity=64):
+        self.objectives = list(objectives)
+        self.index = {k:i for i,k in enumerate(self.objectives)}
+        self.length = length
+        self.size = 0
+        self.free = []
+        self.values = np.zeros((capacity, max(length, 0), len(self.objectives)))
+        # Plain lists, indexing numpy scalars is slower on every append
+        self.heads = [0] * capacity
+        self.counts = [0] * capacity
+
+    def allocate(self):
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.size == len(self.heads):
+                self._grow(2*len(self.heads))
+            slot = self.size
+            self.size = self.size + 1
+        self.heads[slot] = 0
+        self.counts[slot] = 0
+        return slot
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def _grow(self, capacity):
+        def grow(a):
+            b = np.zeros((capacity,) + a.shape[1:], dtype=a.dtype)
+            b[:len(a)] = a
+            return b
+        self.values = grow(self.values)
+        self.heads.extend([0] * (capacity - len(self.heads)))
+        self.counts.extend([0] * (capacity - len(self.counts)))
+
+    def append(self, slot, reward):
+        if not self.index.viewkeys() >= reward.viewkeys():
+            unknown = sorted(set(reward) - set(self.index))
+            raise ValueError("Reward for %s, which are not objectives (%s)" % (", ".join(unknown), ", ".join(self.objectives)))
+        length = self.length
+        if length <= 0: return
+        head = self.heads[slot]
+        self.values[slot, head] = [reward.get(k, NAN) for k in self.objectives]
+        self.heads[slot] = (head+1) % length
+        if self.counts[slot] < length:
+            self.counts[slot] = self.counts[slot] + 1
+
+    def __len__(self):
+        return self.size - len(self.free)
+
+    def count(self, slot):
+        return self.counts[slot]
+
+    # The last k rows of a slot, oldest first
+    def _rows(self, slot, k=None):
+        count = self.counts[slot]
+        if k is None or k > count: k = count
+        return self.values[slot, (self.heads[slot] - k + np.arange(k)) % max(self.length, 1)]
+
+    # The rewards of a slot, oldest first, one value per objective
+    def rows(self, slot):
+        return self._rows(slot).tolist()
+
+    # Replace the rewards of a slot with rows as returned by rows()
+    def setRows(self, slot, rows):
+        length = self.length
+        rows = rows[-length:] if length > 0 else []
+        n = len(rows)
+        if n: self.values[slot, :n] = rows
+        self.heads[slot] = n % length if length > 0 else 0
+        self.counts[slot] = n
+
+    # The last k rewards, oldest first, as the dicts that were appended
+    def last(self, slot, k=None):
+        return [{obj:v for obj,v in zip(self.objectives, row) if v == v}
+                for row in self._rows(slot, k).tolist()]
+
+    # Per objective mean and variance of the last k rewards, 0.0 where there
+    # are none. As dicts, or floats for one objective.
+    def mean(self, slot, objective=None, k=None):
+        return self._summary(slot, objective, k)[0]
+
+    def variance(self, slot, objective=None, k=None):
+        return self._summary(slot, objective, k)[1]
+
+    def _summary(self, slot, objective, k):
+        rows = self._rows(slot, k)
+        given = ~np.isnan(rows)
+        n = np.maximum(given.sum(axis=0), 1)
+        values = np.where(given, rows, 0.0)
+        mean = values.sum(axis=0) / n
+        variance = (np.where(given, values - mean, 0.0)**2).sum(axis=0) / n
+        if objective:
+            i = self.index[objective]
+            return float(mean[i]), float(variance[i])
+        return dict(zip(self.objectives, mean.tolist())), dict(zip(self.objectives, variance.tolist()))
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import struct
+import checkpoint
+
+# Append-only record of how a network changes: nodes added, deleted and made
+# real, and the values of an action after every update. Every
+# snapshot_every ticks a checkpoint (see checkpoint.py) is written next to
+# the journal and marked in it, so the network at any tick can be rebuilt
+# by restoring the last snapshot before it and replaying what came after:
+#
+#   agent = env.createAgent(config.agent)    # a new agent, same config
+#   journal.replay(agent, "output/.../journal.bin", tick)
+#
+# Records are fixed-size (type, time, id) headers followed by a payload
+# whose size follows from the header. A crash can only lose the end of the
+# write buffer, a cut off last record is ignored when reading. The owner
+# closes the journal, see Agent.close.
+
+MAGIC = "ANJL"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")     # magic, version, objectives
+
+ADD, DELETE, REAL, UPDATE, SNAPSHOT = range(5)
+RECORD = struct.Struct("<Bii")      # type, time, node or action id
+ADD_INFO = struct.Struct("<BBB")    # kind, flags, number of inputs
+
+class Journal:
+    def __init__(self, path, network, snapshotEvery=0, buffering=1<<16):
+        self.path = path
+        self.network = network
+        self.snapshotEvery = snapshotEvery
+        self._values = struct.Struct("<i%dd" % (4*len(network.objectives)))
+        self.fp = open(path, "wb", buffering)
+        self.fp.write(HEADER.pack(MAGIC, VERSION, len(network.objectives)))
+
+    def addNode(self, node):
+        flags = (node.virtual and checkpoint.VIRTUAL) | (node.permanent and checkpoint.PERMANENT)
+        self.fp.write(RECORD.pack(ADD, self.network.time, node.n_id) +
+                      ADD_INFO.pack(checkpoint.NODE_KINDS[type(node)], flags, len(node.inputs)) +
+                      struct.pack("<%di" % len(node.inputs), *[x.n_id for x in node.inputs]))
+
+    def deleteNode(self, node):
+        self.fp.write(RECORD.pack(DELETE, self.network.time, node.n_id))
+
+    def makeReal(self, node):
+        self.fp.write(RECORD.pack(REAL, self.network.time, node.n_id))
+
+    def updateQ(self, action):
+        self.fp.write(RECORD.pack(UPDATE, self.network.time, action.getId()) +
+                      self._values.pack(action.triggers, *checkpoint.actionValues(action)))
+
+    def due(self, time):
+        return self.snapshotEvery and time % self.snapshotEvery == 0
+
+    # Checkpoint agent as snapshot-<time>.ckpt and mark it in the journal
+    def snapshot(self, agent):
+        time = self.network.time
+        checkpoint.save(agent, snapshotPath(self.path, time))
+        self.fp.write(RECORD.pack(SNAPSHOT, time, 0))
+        self.fp.flush()
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        if not self.fp.closed: self.fp.close()
+
+def snapshotPath(path, time):
+    return os.path.join(os.path.dirname(path), "snapshot-%d.ckpt" % time)
+
+# The records of a journal as (type, time, id, payload), payload being
+# (kind, flags, input ids) for ADD and (triggers, values) for UPDATE.
+def read(path):
+    fp = open(path, "rb")
+    data = fp.read()
+    fp.close()
+    magic, version, objectives = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an animat journal")
+    if version > VERSION:
+        raise ValueError("Unsupported journal version %d, expected at most %d" % (version, VERSION))
+    values = struct.Struct("<i%dd" % (4*objectives))
+    offset = HEADER.size
+    end = len(data)
+    while offset + RECORD.size <= end:
+        kind, time, id = RECORD.unpack_from(data, offset)
+        offset = offset + RECORD.size
+        payload = None
+        if kind == ADD:
+            if offset + ADD_INFO.size > end: break
+            nodeKind, flags, n = ADD_INFO.unpack_from(data, offset)
+            offset = offset + ADD_INFO.size
+            if offset + 4*n > end: break
+            payload = (nodeKind, flags, struct.unpack_from("<%di" % n, data, offset))
+            offset = offset + 4*n
+        elif kind == UPDATE:
+            if offset + values.size > end: break
+            v = values.unpack_from(data, offset)
+            payload = (v[0], v[1:])
+            offset = offset + values.size
+        yield kind, time, id, payload
+
+# Times of the snapshots marked in a journal
+def snapshots(path):
+    return [time for kind, time, _, _ in read(path) if kind == SNAPSHOT]
+
+# Rebuild the network of agent, a new agent of the same config, as it was
+# at the end of tick. The last snapshot at or before tick is restored
+# first, if there is one. Only the structure and the action values are
+# replayed, activations and the rest of the agent are as in the snapshot.
+def replay(agent, path, tick):
+    records = list(read(path))
+    start = 0
+    for i, (kind, time, _, _) in enumerate(records):
+        if time > tick: break
+        if kind == SNAPSHOT:
+            start = i + 1
+    network = agent.network
+    journal = network.journal
+    network.journal = None
+    if start:
+        checkpoint.restore(agent, checkpoint.load(snapshotPath(path, records[start-1][1])), restoreRandom=False)
+
+    byId = network.byId
+    for kind, time, id, payload in records[start:]:
+        if time > tick: break
+        network.time = time
+        if kind == ADD:
+            nodeKind, flags, inputs = payload
+            node = checkpoint.NODE_CLASSES[nodeKind](inputs=[byId[x] for x in inputs],
+                                                     permanent=bool(flags & checkpoint.PERMANENT))
+            node.virtual = bool(flags & checkpoint.VIRTUAL)
+            network.addNode(node)
+            if node.n_id != id:
+                raise ValueError("Journal out of step, node %d got id %d" % (id, node.n_id))
+        elif kind == DELETE:
+            node = byId[id]
+            network.deleteNode(node)
+            agent.surpriseMatrix.forget(node)
+            agent.surpriseMatrix_SEQ.forget(node)
+        elif kind == REAL:
+            network.makeReal(byId[id])
+        elif kind == UPDATE:
+            triggers, values = payload
+            checkpoint.setActionValues(network.actions[id], triggers, values)
+    network.time = tick
+    network._compiled = None
+    network.journal = journal
+    return agent
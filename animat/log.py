@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import json
+import atexit
+
+DEBUG, INFO, WARNING = 10, 20, 30
+LEVELS = {'debug':DEBUG, 'info':INFO, 'warning':WARNING}
+LEVEL_NAMES = {v:k for k,v in LEVELS.items()}
+
+# Structured event log. Every subsystem has a Channel with one boolean per
+# level, and call sites check it before building anything:
+#
+#     if log.agent.debug: log.agent.event("tick", time=t, nodes=...)
+#
+# so a disabled channel costs one attribute lookup. Records are written as
+# one JSON object per line to a buffered sink.
+class Channel:
+    def __init__(self, name):
+        self.name = name
+        self.debug = False
+        self.info = False
+        self.warning = False
+
+    def setLevel(self, level):
+        self.debug = level <= DEBUG
+        self.info = level <= INFO
+        self.warning = level <= WARNING
+
+    def event(self, name, level=DEBUG, **fields):
+        fields['sys'] = self.name
+        fields['event'] = name
+        fields['level'] = LEVEL_NAMES.get(level, level)
+        _sink.write(fields)
+
+class JsonLinesSink:
+    def __init__(self, fp, close=True):
+        self.fp = fp
+        self._close = close
+
+    def write(self, record):
+        self.fp.write(json.dumps(record, default=str))
+        self.fp.write("\n")
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        self.fp.flush()
+        if self._close: self.fp.close()
+
+class NullSink:
+    def write(self, record): pass
+    def flush(self): pass
+    def close(self): pass
+
+agent = Channel("agent")
+network = Channel("network")
+node = Channel("node")
+action = Channel("action")
+environment = Channel("environment")
+CHANNELS = {x.name:x for x in (agent, network, node, action, environment)}
+
+_sink = NullSink()
+
+# conf is the "log" section of the environment config:
+#   "level":      "debug", "info" or "warning" (default "info")
+#   "subsystems": names of the channels to enable (default all)
+#   "path":       file name relative to outputPath, or "-" for stdout
+#                 (default "log.jsonl")
+def configure(conf, outputPath="."):
+    global _sink
+    close()
+    level = LEVELS[conf.get("level", "info")]
+    enabled = conf.get("subsystems", CHANNELS.keys())
+    for name, channel in CHANNELS.items():
+        channel.setLevel(level if name in enabled else WARNING+1)
+    path = conf.get("path", "log.jsonl")
+    if path == "-":
+        _sink = JsonLinesSink(sys.stdout, close=False)
+    else:
+        _sink = JsonLinesSink(open(os.path.join(outputPath, path), "a", 1<<16))
+
+def close():
+    global _sink
+    _sink.close()
+    _sink = NullSink()
+    for channel in CHANNELS.values():
+        channel.setLevel(WARNING+1)
+
+atexit.register(close)
@@ -17,10 +17,13 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-class Motor:
+class Motor(object):
+    __slots__ = ('name', 'trigger', 'id')
+
     def __init__(self, name, trigger=None):
         self.name = name
         self.trigger = trigger
+        self.id = None # index in Network.motors
 
     def run(self, time):
         self.trigger(self, time)
@@ -18,9 +18,13 @@
 #
 
 import random
+import heapq
+from array import array
 from pprint import pprint
 from action import *
+from history import RewardHistory
 import node
+import log
 
 def oneSum(a,b):
     return min(1, max(-1, a+b))
@@ -80,6 +84,13 @@ Q_FUNCTIONS['weighted'] = lambda Q, status: Q['weighted']
 Q_FUNCTIONS['linear'] = _q_map_linear
 Q_FUNCTIONS['fitted'] = _q_map_fitted
 
+# Eviction order when pruning, nodes with the lowest key go first
+PRUNE_POLICIES = {}
+PRUNE_POLICIES["triggers"] = lambda node: node.getNumTriggers()
+PRUNE_POLICIES["activations"] = lambda node: node.activations
+PRUNE_POLICIES["age"] = lambda node: node.createdAt
+PRUNE_POLICIES["lru"] = lambda node: node.lastActive
+
 class NetworkConfig:
     def __init__(self, conf):
         self.epsilon = conf.get("epsilon", 0.1)
@@ -91,6 +102,26 @@ class NetworkConfig:
         self.reward_learning_factor = conf.get("reward_learning_factor", 0.5)
         self.sensors = conf.get("sensors", "rgb0")
         self.motors = conf.get("motors", ["left", "right", "up", "down", "eat", "drink"])
+        # "recursive" re-evaluates the whole graph every tick, "incremental"
+        # only re-evaluates nodes downstream of something that changed and
+        # "compiled" evaluates a levelized numpy copy of the graph.
+        self.propagation = conf.get("propagation", "recursive")
+        # Step a compiled copy next to the object graph and fail on mismatch
+        self.verify_compiled = conf.get("verify_compiled", False)
+        # Node budget, when exceeded the network is pruned down to
+        # prune_ratio*max_nodes. Nodes younger than prune_min_age are kept.
+        self.max_nodes = conf.get("max_nodes", None)
+        self.prune_policy = conf.get("prune_policy", "triggers")
+        self.prune_ratio = conf.get("prune_ratio", 0.9)
+        self.prune_min_age = conf.get("prune_min_age", 100)
+        # "dict" keeps R/Q/minQ/maxQ in each Action, "numpy" keeps them in a
+        # shared QTable and updates/aggregates them in batches.
+        self.q_store = conf.get("q_store", "dict")
+        # Write structure changes and Q updates to journal.bin in the output
+        # path, with a checkpoint every journal_snapshot_every ticks (0 for
+        # none). See journal.py.
+        self.journal = conf.get("journal", False)
+        self.journal_snapshot_every = conf.get("journal_snapshot_every", 1000)
 
 class Network:
     def __init__(self, config, sensors, motors, objectives):
@@ -102,9 +133,43 @@ class Network:
         self.sensors = sensors
         self.motors = motors
         self.objectives = objectives
+        # Dense integer ids for motors and nodes
+        for i, motor in enumerate(motors):
+            motor.id = i
+        self.byId = []          # node id => node, None for free ids
+        # Adjacency by node id: the ids of a node's inputs in order, and of
+        # the nodes it is an input of (once each, in the order they were added)
+        self.inputIds = []
+        self.outputIds = []
+        self._freeIds = []
         self.lastChange = self.time
+        # Node evaluations and actions looked at by getBestAction, in total
+        self.evaluations = 0
+        self.actionsScanned = 0
         self._utilityFunc = UTILITY_FUNCTIONS.get(config.utility_function)
         self._qFunc = Q_FUNCTIONS.get(config.q_function)
+        self.qtable = None
+        if config.q_store == "numpy":
+            from qtable import QTable
+            self.qtable = QTable(objectives)
+        # The last max_reward_history rewards of every node and action
+        self.history = RewardHistory(objectives, config.max_reward_history)
+        self.journal = None # set by the agent when journaling is on
+        self._incremental = config.propagation == "incremental"
+        self._compiled = None
+        self._dirty = set()             # nodes to re-evaluate next tick
+        self._activeNodes = set()       # currently active nodes (incremental only)
+        self._pendingChanged = set()    # nodes where pendingPreviousActive != previousActive
+        self._lastEvaluated = set()     # nodes evaluated during the last tick
+        # Role indexes, name => node, kept up to date as the network changes
+        self._topNodes = {}
+        self._topActive = {}
+        self._virtualNodes = {}
+        self._activeSensors = []
+        # Sensors and the real nodes on top of them, where _findTopActive looks
+        self._reachable = set()
+        # motor name => {node: action} for the actions of top-active nodes
+        self._availableActions = {motor.name:{} for motor in motors}
         self.addNodes(sensors)
 
     def getTime(self): return self.time
@@ -112,43 +177,170 @@ class Network:
 
     def tick(self):
         self.time = self.time + 1
-        self._previousSensors = self.activeSensors()
+        if self.config.propagation == "compiled" or self.config.verify_compiled:
+            compiled = self._getCompiled()
+        changed = False
+        evaluated = 0
         for node in self.sensors:
-            node.tick(self.time)
-        if self._previousSensors != self.activeSensors():
+            evaluated = evaluated + node.tick(self.time)
+            if node.active != node.pendingPreviousActive: changed = True
+            if self._incremental: self._evaluated(node)
+        if changed:
+            self._activeSensors = [x for x in self.sensors if x.active]
             self.sensorsChanged = True
+        if self.config.propagation == "compiled":
+            compiled.tick(changed)
+            self._setTopActive(compiled.writeBack(self.time))
+            self.evaluations = self.evaluations + compiled.n
+            return
+        if changed:
             self._setPreviousActive()
-        self._propagate() # Tick each node, depth first
+        if self._incremental:
+            self._propagateIncremental()
+            self.evaluations = self.evaluations + len(self._lastEvaluated)
+        else:
+            evaluated = evaluated + self._propagate() # Tick each node, depth first
+            self.evaluations = self.evaluations + evaluated
         self._findTopActive()
+        if self.config.verify_compiled:
+            compiled.tick(changed)
+            mismatches = compiled.mismatches()
+            if mismatches:
+                raise RuntimeError("Compiled network differs at %d: %s" % (self.time, ", ".join(mismatches)))
+
+    # The compiled form is only rebuilt when the structure has changed
+    def _getCompiled(self):
+        if self._compiled is None or self._compiled.lastChange != self.lastChange:
+            import compiled
+            self._compiled = compiled.CompiledNetwork(self)
+        return self._compiled
 
     def _setPreviousActive(self):
-        for node in self.nodes.values():
-            node.previousActive = node.pendingPreviousActive
+        if self._incremental:
+            # Only nodes whose pending state moved need to be copied, and only
+            # their outputs (SEQ-nodes) can see the difference.
+            for node in self._pendingChanged:
+                if node.previousActive != node.pendingPreviousActive:
+                    node.previousActive = node.pendingPreviousActive
+                    self._dirty.update(node.outputs)
+            self._pendingChanged = set()
+        else:
+            for node in self.nodes.values():
+                node.previousActive = node.pendingPreviousActive
 
+    # Returns the number of nodes evaluated
     def _propagate(self):
+        evaluated = 0
         for node in self.topNodes(includeVirtual=True):
-            node.tick(self.time)
-
+            evaluated = evaluated + node.tick(self.time)
+        return evaluated
+
+    # Book-keeping after a node was evaluated in incremental mode, returns
+    # True if its activation changed.
+    def _evaluated(self, node):
+        if node.pendingPreviousActive != node.previousActive:
+            self._pendingChanged.add(node)
+        if node.active:
+            self._activeNodes.add(node)
+        else:
+            self._activeNodes.discard(node)
+        return node.active != node.pendingPreviousActive
+
+    # Re-evaluate only the dirty nodes and whatever they change, in
+    # topological order (lowest level first).
+    def _propagateIncremental(self):
+        time = self.time
+        evaluated = set(self.sensors)
+        for node in self.sensors:
+            if node.active != node.pendingPreviousActive:
+                self._dirty.update(node.outputs)
+        queue = [(node.level, node.n_id, node) for node in self._dirty]
+        heapq.heapify(queue)
+        self._dirty = set()
+        while queue:
+            _, _, node = heapq.heappop(queue)
+            if node in evaluated: continue
+            evaluated.add(node)
+            node.evaluate(time)
+            if self._evaluated(node):
+                for output in node.outputs:
+                    if output not in evaluated:
+                        heapq.heappush(queue, (output.level, output.n_id, output))
+
+        # Nodes we skipped kept their value, catch up on what a full tick
+        # would have done to them.
+        for node in self._lastEvaluated:
+            if node not in evaluated:
+                node.pendingPreviousActive = node.active
+                if node.pendingPreviousActive != node.previousActive:
+                    self._pendingChanged.add(node)
+        for node in self._activeNodes:
+            if node not in evaluated:
+                node.time = time
+                node.lastActive = time
+                node.activations = node.activations + 1
+        self._lastEvaluated = evaluated
+
+    # A node is top-active if it is active and no real node above it is.
+    # Walk down from every active node marking what it covers, without
+    # recursion and visiting every node and edge at most once.
     def _findTopActive(self, verbose=False):
-        for node in self.nodes.values():
+        if self._incremental:
+            active = self._activeNodes
+        else:
+            active = [x for x in self.nodes.values() if x.active]
+        covered = set()
+        stack = [x for x in active if not x.virtual]
+        while stack:
+            node = stack.pop()
+            for i in node.inputs:
+                if i not in covered:
+                    covered.add(i)
+                    # Only real nodes count as outputs of their inputs
+                    if not i.virtual: stack.append(i)
+        self._setTopActive([x for x in active if x not in covered and x in self._reachable])
+
+    def _setTopActive(self, nodes):
+        previous = self._topActive
+        for node in previous.values():
             node.topActive = False
-        for node in self.sensors:
-            node._findTopActive(verbose)
+        self._topActive = {}
+        for node in nodes:
+            node.topActive = True
+            self._topActive[node.name] = node
+        self._updateAvailable(previous)
+
+    # Only nodes that changed top-active status touch the action index
+    def _updateAvailable(self, previous):
+        for name, node in previous.items():
+            if self._topActive.get(name) is not node:
+                self._setAvailable(node, False)
+        for name, node in self._topActive.items():
+            if previous.get(name) is not node:
+                self._setAvailable(node, True)
+
+    def _setAvailable(self, node, available):
+        for action in node.actions:
+            actions = self._availableActions.setdefault(action.motor.name, {})
+            if available:
+                actions[node] = action
+            else:
+                actions.pop(node, None)
 
     def activeSensors(self):
-        return [x for x in self.sensors if x.active]
+        return self._activeSensors
 
     def allNodes(self):
         return self.nodes.values()
 
     def topNodes(self, includeVirtual=False):
-        return [x for x in self.nodes.values() if x.isTopNode(includeVirtual)]
+        return [x for x in self._topNodes.values() if includeVirtual or not x.virtual]
 
     def activeTopNodes(self, includeVirtual=False):
-        return [x for x in self.nodes.values() if x.isTopActive(includeVirtual)]
+        return [x for x in self._topActive.values() if includeVirtual or not x.virtual]
 
     def virtualNodes(self):
-        return [x for x in self.nodes.values() if x.isVirtual()]
+        return self._virtualNodes.values()
 
     def activeVirtualNodes(self):
         return [x for x in self.virtualNodes() if x.isActive()]
@@ -159,22 +351,136 @@ class Network:
 
     def addNode(self, node):
         if self.hasNode(node): return False
+        if self._freeIds:
+            node.n_id = self._freeIds.pop()
+            self.byId[node.n_id] = node
+        else:
+            node.n_id = len(self.byId)
+            self.byId.append(None)
+            self.inputIds.append(None)
+            self.outputIds.append(None)
+        id = node.n_id
+        node.network = self
+        self.byId[id] = node
+        self.inputIds[id] = array('i', [x.getId() for x in node.inputs])
+        self.outputIds[id] = array('i')
+        for i in self.inputIds[id]:
+            if id not in self.outputIds[i]: self.outputIds[i].append(id)
         self.nodes[node.getName()] = node
+        if node.realOutputCount == 0:
+            self._topNodes[node.name] = node
+        if node.virtual:
+            self._virtualNodes[node.name] = node
+        else:
+            self._addRealOutput(node)
+        self._updateReachable(node)
         self.node_count = self.node_count + 1
         node.setNetwork(self)
+        if self._incremental: self._dirty.add(node)
+        if self.journal: self.journal.addNode(node)
         self.lastChange = self.time
         return True
 
     def deleteNode(self, node):
-        # Can only delete top-nodes
+        # Can only delete top-nodes, and not while a virtual node still uses
+        # it as input.
         if node.permanent: return False
         if node.isTopNode() != True: return False
-        for i in node.inputs:
-            i.outputs.remove(node)
+        if node.outputs: return False
+        if self.journal: self.journal.deleteNode(node)
+        # A SEQ can have the same input twice, it is only one output of it
+        # but counted once per occurrence, see _addRealOutput
+        id = node.n_id
+        for i in set(self.inputIds[id]):
+            outputs = self.outputIds[i]
+            outputs.pop(outputs.index(id))
+        if not node.virtual:
+            for i in node.inputs:
+                i.realOutputCount = i.realOutputCount - 1
+                if i.realOutputCount == 0 and self.nodes.get(i.name) == i:
+                    self._topNodes[i.name] = i
+        if self._topActive.get(node.name) is node:
+            self._setAvailable(node, False)
+            node.topActive = False
         del self.nodes[node.name]
+        # The id, history slots and QTable rows will be reused. Clear them
+        # on the node and its actions, so using them after this fails.
+        for action in node.actions:
+            self.actions.pop(action.getId(), None)
+            self.history.release(action.historySlot)
+            action.historySlot = None
+            if self.qtable is not None:
+                self.qtable.release(action.row)
+                action.row = None
+        self.history.release(node.historySlot)
+        node.historySlot = None
+        self.byId[id] = None
+        self.inputIds[id] = None
+        self.outputIds[id] = None
+        self._freeIds.append(id)
+        node.n_id = None
+        for index in (self._topNodes, self._topActive, self._virtualNodes):
+            index.pop(node.name, None)
+        for index in (self._dirty, self._activeNodes, self._pendingChanged, self._lastEvaluated, self._reachable):
+            index.discard(node)
         self.lastChange = self.time
         return True
 
+    def makeReal(self, node):
+        if not node.virtual: return False
+        node.virtual = False
+        self._virtualNodes.pop(node.name, None)
+        self._addRealOutput(node)
+        self._updateReachable(node)
+        if self.journal: self.journal.makeReal(node)
+        self.lastChange = self.time
+        return True
+
+    # A node is reachable if it is a sensor, or real and on top of a reachable
+    # node. Making a node real can make the real nodes above it reachable.
+    def _updateReachable(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node in self._reachable: continue
+            if node in self.sensors or (not node.virtual and any([i in self._reachable for i in node.inputs])):
+                self._reachable.add(node)
+                stack.extend([x for x in node.outputs if not x.virtual])
+
+    # node has become a real output of its inputs, they are no longer top nodes
+    def _addRealOutput(self, node):
+        for i in node.inputs:
+            i.realOutputCount = i.realOutputCount + 1
+            self._topNodes.pop(i.name, None)
+
+    # Evict nodes until we're back under budget. Only top-nodes can be deleted,
+    # the inputs left without outputs become candidates in the same pass so
+    # whole dead subtrees go away. Returns the deleted nodes.
+    def prune(self, protected=()):
+        budget = self.config.max_nodes
+        if not budget or len(self.nodes) <= budget: return []
+        target = int(budget * self.config.prune_ratio)
+        key = PRUNE_POLICIES.get(self.config.prune_policy)
+
+        def prunable(node):
+            return (not node.permanent and not node.outputs and not node.topActive
+                    and node.network == self and node not in protected
+                    and node.getAge() >= self.config.prune_min_age)
+
+        candidates = [(key(x), x.n_id, x) for x in self.topNodes() if prunable(x)]
+        heapq.heapify(candidates)
+        removed = []
+        while candidates and len(self.nodes) > target:
+            _, _, node = heapq.heappop(candidates)
+            if self.nodes.get(node.name) is not node: continue
+            inputs = node.inputs
+            if not self.deleteNode(node): continue
+            removed.append(node)
+            for i in set(inputs):
+                if self.nodes.get(i.name) is i and prunable(i) and i.isTopNode():
+                    heapq.heappush(candidates, (key(i), i.n_id, i))
+        return removed
+
     def findNode(self, name):
         return self.nodes.get(name, None)
 
@@ -190,13 +496,22 @@ class Network:
         else:
             return self.findNode(node.getName()) != None
 
+    # Actions are keyed by a single integer made from the node and motor ids
+    def actionId(self, node, motor):
+        return node.getId() * len(self.motors) + motor.id
+
     def createAction(self, node, motor, reward=None):
-        actionId = (node.getId(), motor)
+        actionId = self.actionId(node, motor)
         if actionId in self.actions:
             return self.actions[actionId]
         else:
-            action = Action(self, node, motor, reward)
+            if self.qtable is not None:
+                action = TableAction(self, node, motor, reward)
+            else:
+                action = Action(self, node, motor, reward)
             self.actions[actionId] = action
+            if action.isAvailable():
+                self._availableActions.setdefault(motor.name, {})[node] = action
             return action
 
     def knownActions(self, objective=None):
@@ -206,35 +521,63 @@ class Network:
             actions.append((action.getV(objective), action.desc()))
         return sorted(actions, key=lambda x: -x[0])
 
-    def availableActions(self):
-        return [a for a in self.actions.values() if a.isAvailable()]
+    def availableActions(self, motor=None):
+        if motor:
+            return self._availableActions.get(motor, {}).values()
+        return [a for actions in self._availableActions.values() for a in actions.values()]
+
+    # Learn the outcome of taking motor for all nodes at once
+    def updateQ(self, nodes, motor, reward, Qst1a):
+        if self.qtable is None:
+            for node in nodes:
+                node.updateQ(motor, reward, Qst1a)
+            return
+
+        if log.network.debug:
+            log.network.event("updateQ", nodes=[x.name for x in nodes], motor=motor, reward=reward, Qst1a=Qst1a)
+        actions = []
+        for node in nodes:
+            self.history.append(node.historySlot, reward)
+            action = node.findAction(motor)
+            self.history.append(action.historySlot, reward)
+            actions.append(action)
+        if actions:
+            self.qtable.update([action.row for action in actions], reward, Qst1a, self.config)
+            if self.journal:
+                for action in actions:
+                    self.journal.updateQ(action)
 
     def evaluateActionUtility(self, actionQ, status):
         newQ = {objective:self._qFunc(Q, status) for objective,Q in actionQ.items()}
-        print "*** EAU", actionQ, status, newQ
+        if log.network.debug:
+            log.network.event("actionUtility", Q=actionQ, status=status, utilityQ=newQ)
         return self._utilityFunc( newQ, status)
 
     def predictR(self, motor):
         R = { k:0.0 for k in self.objectives }
         C = 0.0
         N = 0
-        for action in self.availableActions():
-            if action.motor.name == motor:
-                C = C + 1
-                N = N + action.triggers
-                for objective in self.objectives:
-                    R[objective] = R[objective] + action.getR(objective)
+        if self.qtable is not None:
+            actions = self.availableActions(motor)
+            N = sum([action.triggers for action in actions])
+            return self.qtable.meanR([action.row for action in actions]), N
+        for action in self.availableActions(motor):
+            C = C + 1
+            N = N + action.triggers
+            for objective in self.objectives:
+                R[objective] = R[objective] + action.getR(objective)
         return {k:v/C for k,v in R.items()}, N
 
     def getBestAction(self, status, epsilon=None):
-        actions = {motor.name:[] for motor in self.motors}
-        for action in self.availableActions():
-            actions[action.motor.name].append(action)
-
-        print "ACTIONS", action
+        actions = {motor.name:self.availableActions(motor.name) for motor in self.motors}
+        for v in actions.values():
+            self.actionsScanned = self.actionsScanned + len(v)
 
         actions_objective = {}
         for motor,v in actions.items():
+            if self.qtable is not None:
+                actions_objective[motor] = self.qtable.aggregate([action.row for action in v])
+                continue
             actionsQ = {}
             actions_objective[motor] = actionsQ
             for obj in self.objectives:
@@ -245,14 +588,18 @@ class Network:
                     'weighted': weightedMean([(action.getQ(obj),action.triggers) for action in v]),
                 }
 
-        print "=> OBJECTIVE_ACTIONS",;pprint(actions_objective)
+        debug = log.network.debug
+        if debug:
+            available = {motor:[action.node.name for action in v] for motor,v in actions.items()}
 
         actions = []
         for action, v in actions_objective.items():
             actions.append((self.evaluateActionUtility(v, status), action, v))
 
         actions = sorted(actions, key=lambda x:-x[0])
-        print "DECIDE", actions
+        if debug:
+            log.network.event("decide", available=available, objectives=actions_objective,
+                              ranking=[(x[0], x[1]) for x in actions])
 
         # Shouldn't really happend, unless the network is empty
         if len(actions) == 0:
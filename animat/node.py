@@ -18,6 +18,7 @@
 #
 
 import random
+import log
 
 def makeName(kind, nodes, sort=True):
     if sort:
@@ -29,67 +30,122 @@ def safeDivide(a,b,c=0.0):
     if b != 0: return a/b
     else: return c
 
-class Node:
-    def __init__(self, name=None, inputs=None, outputs=None, permanent=False, virtual=False):
+class Node(object):
+    # Networks grow to tens of thousands of nodes, keep them compact
+    __slots__ = ('name', 'active', 'previousActive', 'pendingPreviousActive',
+                 'inputs', 'actions', 'time', 'activations',
+                 'createdAt', 'topActive', 'realOutputCount', 'permanent',
+                 'network', 'virtual', 'historySlot', 'level', 'n_id',
+                 'lastActive', 'ancestors', 'sensorAncestors')
+
+    def __init__(self, name=None, inputs=None, permanent=False, virtual=False):
         self.name = name
         self.active = False
         self.previousActive = False
         self.pendingPreviousActive = False
-        self.inputs = inputs or []
-        self.outputs = outputs or []
+        # The input nodes, resolved once for evaluation. Network.inputIds
+        # and Network.outputIds hold the adjacency by id.
+        self.inputs = tuple(inputs or ())
         self.actions = []
         self.time = 0
         self.activations = 0
+        self.lastActive = 0
         self.createdAt = 0
         self.topActive = False
+        self.realOutputCount = 0 # maintained by the network
         self.permanent=permanent
         self.network = None
+        self.n_id = None
         self.virtual = virtual
-        self.rewardHistory = []
-        for node in self.inputs:
-            node.addOutput(self)
+        self.historySlot = None # row in Network.history
+        # Ancestry labels, set by setNetwork, see isParent
+        self.ancestors = frozenset()
+        self.sensorAncestors = 0
+        # Topological depth, sensors are level 0
+        self.level = max([x.level for x in self.inputs]) + 1 if self.inputs else 0
 
     def getName(self):
         return self.name
 
+    # The last max_reward_history rewards, oldest first
+    @property
+    def rewardHistory(self):
+        if self.network is None: return []
+        assert self.n_id is not None, "%s has been deleted" % self.name
+        return self.network.history.last(self.historySlot)
+
+    # Dense integer id, assigned by Network.addNode and reused after a node
+    # has been deleted.
     def getId(self):
-        return id(self)
+        assert self.n_id is not None, "%s is not in a network" % self.name
+        return self.n_id
+
+    # The nodes this node is an input of
+    @property
+    def outputs(self):
+        if self.network is None: return []
+        assert self.n_id is not None, "%s has been deleted" % self.name
+        byId = self.network.byId
+        return [byId[i] for i in self.network.outputIds[self.n_id]]
 
     def isVirtual(self):
         return self.virtual
 
     # Return true if 'node' a child of self, or current node.
     # TODO: Rename?
+    #
+    # Constant time on the labels setNetwork computes once per node: the
+    # sensors below it as a bitmask of their ids (sensors are added first and
+    # never deleted, so the ids are small and stable) and the ids of the other
+    # nodes below it as a frozenset. Memory grows with the number of ancestors
+    # a node really has, not with the size of the network the way a bitset
+    # over all ids does. An id is only reused after its node was deleted, and
+    # nodes with outputs are never deleted, so the labels stay valid.
     def isParent(self, node):
         if self == node: return True
-        for x in self.inputs:
-            if x.isParent(node): return True
-        return False
+        if node.level >= self.level: return False
+        if node.level == 0: return (self.sensorAncestors >> node.n_id) & 1 == 1
+        return node.n_id in self.ancestors
 
-    # Evaluate/Propagate this node.
+    # Evaluate/Propagate this node, inputs first.
+    # Evaluate this node and its inputs, returns the number of nodes that
+    # were evaluated (0 if it already was up to date).
     def tick(self, time):
         if self.time >= time:
-            return False
+            return 0
+        n = 1
+        for node in self.inputs:
+            n = n + node.tick(time)
+        self.evaluate(time)
+        return n
+
+    # Evaluate this node only, assuming its inputs are already up to date.
+    # Subclasses compute their activation after calling this.
+    def evaluate(self, time):
         self.time = time
         self.pendingPreviousActive = self.active
         self.active = False
-        for node in self.inputs:
-            node.tick(time)
-        return True
 
     def setNetwork(self, network):
         self.network = network
         self.createdAt = network.getTime()
-        self.n_id = network.getNodeCount()
+        self.historySlot = network.history.allocate()
+        sensors = 0
+        ancestors = set()
+        for x in self.inputs:
+            if x.level == 0:
+                sensors |= 1 << x.n_id
+            else:
+                sensors |= x.sensorAncestors
+                ancestors.add(x.n_id)
+                ancestors.update(x.ancestors)
+        self.sensorAncestors = sensors
+        self.ancestors = frozenset(ancestors)
 
         # TODO: Evaluate if we shouldn't add all actions by default?
         for motor in network.motors:
             self.createAction(motor)
 
-    def addOutput(self, node):
-        if node not in self.outputs:
-            self.outputs.append(node)
-
     # TODO: Should we handle previousActive here, or in tick?
     # Does previousActive mean it was active the previous tick, or should a node
     # be able to remain active until it's updated again. Stochastic updates?
@@ -98,6 +154,7 @@ class Node:
         if self.time <= time:
             self.active = True
             self.time = time
+            self.lastActive = time
             self.activations = self.activations + 1
 
     def deactivate(self, time):
@@ -132,7 +189,7 @@ class Node:
         if includeVirtual==False and self.virtual:
             return False
         else:
-            return len([x for x in self.outputs if not x.isVirtual()]) == 0
+            return self.realOutputCount == 0
 
     def isTopActive(self, includeVirtual=False):
         if includeVirtual==False and self.virtual:
@@ -143,23 +200,10 @@ class Node:
     def realOutputs(self):
         return [x for x in self.outputs if not x.isVirtual()]
 
-    # Utility function used by network to find topActive nodes when propagating.
-    # Traverse tree from bottom to top (sensors => topnodes), depth first
-    def _findTopActive(self, verbose=False):
-        found = False
-        for node in self.realOutputs():
-            found = node._findTopActive(verbose) or found
-        if found:
-            return True
-        elif self.active:
-            self.topActive = True
-        return self.topActive
-
     def updateQ(self, motor, reward, Qst1a):
-        print "Node updateQ", self.name, motor, reward, Qst1a
-        self.rewardHistory.append(reward)
-        if len(self.rewardHistory) > self.network.config.max_reward_history:
-            del self.rewardHistory[0]
+        if log.node.debug:
+            log.node.event("updateQ", node=self.name, motor=motor, reward=reward, Qst1a=Qst1a)
+        self.network.history.append(self.historySlot, reward)
 
         action = self.findAction(motor)
         action.updateQ(reward, Qst1a)
@@ -174,12 +218,15 @@ class Node:
         return Q
 
     def desc(self):
-        return "%s = %s %d %d %d\n\t%s" % (self.getName(), self.active, self.activations, self.time-self.createdAt, len(self.actions), ",\n".join([x.desc() for x in self.actions]))
+        return "%s = %s %d %d %d\n\t%s" % (self.getName(), self.active, self.activations, self.getAge(), len(self.actions), ",\n".join([x.desc() for x in self.actions]))
 
     def d(self):
-        return (self.getName(), {'virtual':self.virtual, 'active':self.active, 'activations':self.activations, 'age':self.time-self.createdAt, 'numTriggers':self.getNumTriggers(), 'numActions':self.getNumActions(), 'Q':self.getQ(), 'actions':dict([a.d() for a in sorted(self.actions, key=lambda x:x.triggers)])})
+        return (self.getName(), {'virtual':self.virtual, 'active':self.active, 'activations':self.activations, 'age':self.getAge(), 'numTriggers':self.getNumTriggers(), 'numActions':self.getNumActions(), 'Q':self.getQ(), 'rewardMean':self.network.history.mean(self.historySlot), 'rewardVariance':self.network.history.variance(self.historySlot), 'actions':dict([a.d() for a in sorted(self.actions, key=lambda x:x.triggers)])})
 
+    # Nodes that are not re-evaluated (incremental propagation) keep an old
+    # self.time, so use the network clock when we have one.
     def getAge(self):
+        if self.network: return self.network.getTime()-self.createdAt
         return self.time-self.createdAt
 
     def getNumActions(self):
@@ -189,4 +236,5 @@ class Node:
         return sum([a.triggers for a in self.actions])
 
     def makeReal(self):
-        self.virtual = False
+        if self.network: self.network.makeReal(self)
+        else: self.virtual = False
@@ -30,56 +30,53 @@ def truth(v):
     return (on, off, total)
 
 class AndNode(Node):
-    def __init__(self, name=None, inputs=[], outputs=[],permanent=False,virtual=False):
+    __slots__ = ()
+
+    def __init__(self, name=None, inputs=[], permanent=False, virtual=False):
         inputs = sorted(inputs, key=lambda x: x.name)
         if not name: name = makeName("AND", inputs)
-        Node.__init__(self, name, inputs, outputs, permanent, virtual)
+        Node.__init__(self, name, inputs, permanent, virtual)
 
-    def tick(self, time):
-        if Node.tick(self, time):
-            v = [node.active for node in self.inputs]
-            on, off, total = truth(v)
-            if total > 0 and total == on:
-                self.activate(time)
-            else:
-                self.deactivate(time)
-            return True
+    def evaluate(self, time):
+        Node.evaluate(self, time)
+        v = [node.active for node in self.inputs]
+        on, off, total = truth(v)
+        if total > 0 and total == on:
+            self.activate(time)
         else:
-            return False
+            self.deactivate(time)
 
 class NAndNode(Node):
-    def __init__(self, name=None, inputs=[], outputs=[], permanent=False):
+    __slots__ = ()
+
+    def __init__(self, name=None, inputs=[], permanent=False):
         inputs = sorted(inputs, key=lambda x: x.name)
         if not name: name = makeName("NAND", inputs)
-        Node.__init__(self, name, inputs, outputs, permanent)
+        Node.__init__(self, name, inputs, permanent)
 
-    def tick(self, time):
-        if Node.tick(self, time):
-            v = [node.active for node in self.inputs]
-            on, off, total = truth(v)
-            if total > 0 and total == on:
-                self.deactivate(time)
-            else:
-                self.activate(time)
-            return True
+    def evaluate(self, time):
+        Node.evaluate(self, time)
+        v = [node.active for node in self.inputs]
+        on, off, total = truth(v)
+        if total > 0 and total == on:
+            self.deactivate(time)
         else:
-            return False
+            self.activate(time)
 
 class SEQNode(Node):
-    def __init__(self, name=None, inputs=[], outputs=[],permanent=False,virtual=False):
+    __slots__ = ()
+
+    def __init__(self, name=None, inputs=[], permanent=False, virtual=False):
         if not name: name = makeName("SEQ", inputs, sort=False)
-        Node.__init__(self, name, inputs, outputs, permanent, virtual)
+        Node.__init__(self, name, inputs, permanent, virtual)
 
-    def tick(self, time):
-        if Node.tick(self, time):
-            if len(self.inputs) > 1:
-                if self.inputs[0].wasActive() and self.inputs[1].isActive():
-                    self.activate(time)
-                else:
-                    self.deactivate(time)
-            return True
-        else:
-            return False
+    def evaluate(self, time):
+        Node.evaluate(self, time)
+        if len(self.inputs) > 1:
+            if self.inputs[0].wasActive() and self.inputs[1].isActive():
+                self.activate(time)
+            else:
+                self.deactivate(time)
 
 # TODO: must update tick code...
 #
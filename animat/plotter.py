@@ -59,7 +59,6 @@ def plot(network, path=None):
     nodes = dict(enumerate(network.nodes.values()))
     edges = []
 
-    for k,v in nodes.items(): v.__nx_id__ = k+1
     for k,v in nodes.items():
         if len(v.inputs) == 0:
             edges.append( (0, v.name) )
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy as np
+
+# Storage for the R, Q, minQ, maxQ and triggers of every action in a network,
+# one row per action and one column per objective. Used instead of the
+# per-action dicts when the network is configured with "q_store": "numpy".
+class QTable:
+    def __init__(self, objectives, capacity=256):
+        self.objectives = list(objectives)
+        self.index = {k:i for i,k in enumerate(self.objectives)}
+        self.size = 0
+        self.free = []
+        shape = (capacity, len(self.objectives))
+        self.triggers = np.zeros(capacity, dtype=np.int64)
+        self.R = np.zeros(shape)
+        self.Q = np.zeros(shape)
+        self.minQ = np.zeros(shape)
+        self.maxQ = np.zeros(shape)
+
+    def allocate(self):
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == len(self.triggers):
+                self._grow(2*len(self.triggers))
+            row = self.size
+            self.size = self.size + 1
+        self.triggers[row] = 0
+        for values in (self.R, self.Q, self.minQ, self.maxQ):
+            values[row] = 0.0
+        return row
+
+    def release(self, row):
+        self.free.append(row)
+
+    def _grow(self, capacity):
+        def grow(a):
+            b = np.zeros((capacity,) + a.shape[1:], dtype=a.dtype)
+            b[:len(a)] = a
+            return b
+        self.triggers = grow(self.triggers)
+        self.R = grow(self.R)
+        self.Q = grow(self.Q)
+        self.minQ = grow(self.minQ)
+        self.maxQ = grow(self.maxQ)
+
+    def get(self, values, row, objective=None):
+        assert row is not None, "the row has been released"
+        if objective:
+            i = self.index.get(objective)
+            if i is None: return 0.0
+            return float(values[row, i])
+        else:
+            return dict(zip(self.objectives, values[row].tolist()))
+
+    # Same update as Action.updateQ, applied to all rows in one step.
+    def update(self, rows, reward, Qst1a, config):
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.array([self.index[k] for k in reward.keys()], dtype=np.intp)
+        r = np.array(reward.values(), dtype=float)
+        qs = np.array([Qst1a.get(k, 0.0) for k in reward.keys()], dtype=float)
+        cells = np.ix_(rows, cols)
+
+        triggers = self.triggers[rows] + 1
+        self.triggers[rows] = triggers
+
+        reward_discount = config.reward_learning_factor
+        self.R[cells] = (1-reward_discount) * self.R[cells] + reward_discount * r
+
+        learning = config.q_learning_factor
+        gamma = config.q_discount_factor
+        Q = self.Q[cells]
+        Q = Q + learning * (r + gamma*qs - Q)
+        self.Q[cells] = Q
+        first = (triggers == 1)[:,np.newaxis]
+        self.minQ[cells] = np.where(first, Q, np.minimum(self.minQ[cells], Q))
+        self.maxQ[cells] = np.where(first, Q, np.maximum(self.maxQ[cells], Q))
+
+    # The per-objective min/max/mean/weighted Q of a set of actions, in the
+    # form used by Network.getBestAction.
+    def aggregate(self, rows):
+        rows = np.asarray(rows, dtype=np.intp)
+        Q = self.Q[rows]
+        triggers = self.triggers[rows]
+        minQ = self.minQ[rows].min(axis=0)
+        maxQ = self.maxQ[rows].max(axis=0)
+        meanQ = Q.mean(axis=0)
+        total = triggers.sum()
+        if total == 0:
+            # Matches weightedMean(), which falls back on the last value
+            weighted = Q[-1]
+        else:
+            weighted = (Q * triggers[:,np.newaxis]).sum(axis=0) / float(total)
+        result = {}
+        for obj,i in self.index.items():
+            result[obj] = {
+                'min': float(minQ[i]),
+                'max': float(maxQ[i]),
+                'mean': float(meanQ[i]),
+                'weighted': float(weighted[i]),
+            }
+        return result
+
+    # Mean R over a set of actions, as a dict
+    def meanR(self, rows):
+        R = self.R[np.asarray(rows, dtype=np.intp)].mean(axis=0)
+        return dict(zip(self.objectives, R.tolist()))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import json
+import random
+import itertools
+import multiprocessing
+from pprint import pprint
+from environment import *
+from stats import printReport
+import gridworld
+import trail
+import log
+
+# Run one episode of conf, writing into outputPath (including the phase times
+# and counters in stats.json). Returns the episode number and a summary of
+# its wellbeeing: the number of ticks, the final and integrated wellbeeing
+# and the file with the whole trail (see trail.records, None if it is
+# empty). Only plain data goes in and out, so it can run in a worker process.
+def runEpisode(args):
+    conf, outputPath, episode, seed, dump = args
+    random.seed(seed)
+    config = EnvironmentConfig(conf, outputPath)
+    env = VirtualEnvironment(config)
+    # Workers don't run atexit handlers, so close what the episode writes
+    # when it ends
+    try:
+        agent = env.createAgent(config.agent)
+
+        for i in range(config.maxIterations):
+            env.tick()
+            if agent.wellbeeing() <= 0.0:
+                if log.agent.info: log.agent.event("dead", log.INFO, time=agent.network.time, episode=episode)
+                break
+
+        # The cells the episode changed
+        env.world.writeDiff(os.path.join(config.outputPath, "world-diff.csv"))
+
+        report = agent.tickStats()
+        fp = open(os.path.join(config.outputPath, "stats.json"), "w")
+        json.dump(report, fp, indent=1, sort_keys=True)
+        fp.close()
+
+        # Dump the network, trail and surprise matrices.
+        if dump:
+            agent.network.printNetwork()
+            env.printWorld()
+            for i,x in enumerate(agent.trail):
+                print i, x[0], x[1]
+            print "SURPRISE MATRIX"
+            pprint(agent.surpriseMatrix.toDict())
+            print "SEQ SURPRISE MATRIX"
+            pprint(agent.surpriseMatrix_SEQ.toDict())
+            printReport(report)
+
+        wellbeeing = agent.wellbeeingTrail
+        summary = {'ticks':len(wellbeeing), 'final':wellbeeing.last(1)[0] if len(wellbeeing) else 0.0,
+                   'integrated':float(sum(wellbeeing)), 'wellbeeing':wellbeeing.save()}
+        return episode, summary
+    finally:
+        env.close()
+        log.close()
+
+# Run repeats episodes of conf over a pool of processes (all cores by
+# default, 1 runs them in this process). Every episode gets its own seed,
+# world and output directory under outputPath. Yields (episode, wellbeeing
+# summary) in the order the episodes finish. Episode 0 is dumped if dump is set.
+def runEpisodes(conf, outputPath, repeats, processes=None, seed=None, dump=False):
+    rng = random.Random(seed)
+    tasks = []
+    for episode in range(repeats):
+        path = os.path.join(outputPath, "episode-%d" % episode)
+        tasks.append((conf, path, episode, rng.randrange(2**31), dump and episode == 0))
+
+    for result in runTasks(tasks, processes):
+        yield result
+
+# runEpisode over a list of its argument tuples, in a pool of processes
+# unless processes is 1. Yields the results in the order they finish.
+def runTasks(tasks, processes=None):
+    if processes == 1 or len(tasks) == 1:
+        for task in tasks:
+            yield runEpisode(task)
+        return
+
+    # Workers are forked with the worlds already loaded, sharing them
+    for task in tasks:
+        gridworld.preload(task[0])
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(runEpisode, tasks):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+# One column per episode, one row per tick, cut at the shortest episode.
+# Streams the rows from the trail files in the summaries of runEpisode.
+def writeWellbeeing(path, summaries):
+    columns = [trail.records(x['wellbeeing']) if x['wellbeeing'] else iter(()) for x in summaries]
+    fp = open(path, "w")
+    first = True
+    for line in itertools.izip(*columns):
+        if not first: fp.write("\n")
+        fp.write(";".join([str(x).replace(".",",") for x in line]))
+        first = False
+    fp.write("\n")
+    fp.close()
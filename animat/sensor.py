@@ -21,15 +21,14 @@ from node import *
 
 
 class SensorNode(Node):
+    __slots__ = ('sense',)
+
     def __init__(self, name, sense=None):
         Node.__init__(self, name, permanent=True)
         self.sense=sense
 
-    def tick(self, time):
-        if Node.tick(self, time):
-            x = self.sense(time)
-            if x: self.activate(time)
-            else: self.deactivate(time)
-            return True
-        else:
-            return False
+    def evaluate(self, time):
+        Node.evaluate(self, time)
+        x = self.sense(time)
+        if x: self.activate(time)
+        else: self.deactivate(time)
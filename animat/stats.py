@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+from timeit import default_timer
+
+# A monotonic clock, so phase times don't jump when the wall clock is set.
+# Python 3 has time.monotonic, on Python 2 the monotonic backport from PyPI
+# provides it on every platform. Without it timeit.default_timer is used,
+# that is time.time on Unix, which does follow changes to the wall clock.
+try:
+    from monotonic import monotonic as timer
+except ImportError:
+    timer = getattr(time, "monotonic", None) or default_timer
+
+# Time spent per phase of a tick, and event counters. Only every `every`th
+# tick is timed (0 turns timing off), counters are always kept. Phases are
+# timed in laps, each one from the end of the previous:
+#
+#     stats.startTick()
+#     ...
+#     stats.lap("observe")
+#
+# On ticks that aren't sampled a lap only costs a comparison.
+class TickStats:
+    def __init__(self, every=1):
+        self.every = every
+        self.ticks = 0
+        self.sampled = 0
+        self.times = {}
+        self.counters = {}
+        self._last = None # start of the current lap, None when not sampling
+
+    def startTick(self):
+        self.ticks = self.ticks + 1
+        if self.every and self.ticks % self.every == 0:
+            self.sampled = self.sampled + 1
+            self._last = timer()
+        else:
+            self._last = None
+
+    def lap(self, phase):
+        if self._last is None: return
+        now = timer()
+        self.times[phase] = self.times.get(phase, 0.0) + (now - self._last)
+        self._last = now
+
+    # Start the next lap now, leaving out the time since the last one
+    def skip(self):
+        if self._last is not None:
+            self._last = timer()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    # Seconds per phase: measured on the sampled ticks, their mean per tick
+    # and the estimate for all ticks.
+    def report(self):
+        phases = {}
+        for phase, total in self.times.items():
+            mean = total / self.sampled
+            phases[phase] = {'sampled': total, 'mean': mean, 'estimated': mean * self.ticks}
+        return {
+            'ticks': self.ticks,
+            'sampled_ticks': self.sampled,
+            'phases': phases,
+            'counters': dict(self.counters),
+        }
+
+def printReport(report):
+    print "TICKS", report['ticks'], "sampled", report['sampled_ticks']
+    phases = report['phases']
+    total = sum([x['mean'] for x in phases.values()]) or 1.0
+    for phase, x in sorted(phases.items(), key=lambda x: -x[1]['mean']):
+        print "  %-12s %10.6f s/tick %5.1f%%" % (phase, x['mean'], 100.0 * x['mean'] / total)
+    for name, n in sorted(report['counters'].items()):
+        print "  %-16s %d" % (name, n)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import heapq
+
+ID_BITS = 32
+
+# Running average reward for pairs of nodes, keyed on the node ids packed
+# into one integer. When more than capacity pairs are stored the ones that
+# were updated longest ago are evicted, down to ratio*capacity so it doesn't
+# happen every tick.
+class SurpriseMatrix:
+    def __init__(self, capacity=None, ratio=0.9):
+        self.capacity = capacity
+        self.ratio = ratio
+        self.entries = {} # key => [a, b, average reward, last update]
+        self._byNode = {} # node => set of keys that node is part of
+
+    def key(self, a, b):
+        return (a.n_id << ID_BITS) | b.n_id
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, a, b, default=None):
+        entry = self.entries.get(self.key(a, b))
+        if entry is None: return default
+        return entry[2]
+
+    def set(self, a, b, value, time):
+        k = self.key(a, b)
+        entry = self.entries.get(k)
+        if entry is None:
+            self.entries[k] = [a, b, value, time]
+            self._byNode.setdefault(a, set()).add(k)
+            self._byNode.setdefault(b, set()).add(k)
+        else:
+            entry[2] = value
+            entry[3] = time
+
+    def evict(self):
+        if not self.capacity or len(self.entries) <= self.capacity: return 0
+        count = len(self.entries) - int(self.capacity * self.ratio)
+        oldest = heapq.nsmallest(count, self.entries.iteritems(), key=lambda x: x[1][3])
+        for k,_ in oldest:
+            self._remove(k)
+        return count
+
+    # Drop every pair a deleted node is part of, before its id is reused
+    def forget(self, node):
+        for k in list(self._byNode.get(node, ())):
+            self._remove(k)
+
+    def _remove(self, k):
+        a, b, _, _ = self.entries.pop(k)
+        for node in (a, b):
+            keys = self._byNode.get(node)
+            if keys is not None:
+                keys.discard(k)
+                if not keys: del self._byNode[node]
+
+    # The n pairs with the lowest score(value), as (score, (a, b), value).
+    # Ties are broken on the node names, the same order sorting the old
+    # name-keyed dicts gave.
+    #
+    # The score depends on the reward of the tick, so there is no order to
+    # keep between calls and every pair is scored. Only the pairs that can
+    # make the cut get the names for the tie-break.
+    def leastSurprised(self, score, n=1):
+        items = [(score(v), a, b, v) for a,b,v,_ in self.entries.itervalues()]
+        if not items: return []
+        cut = heapq.nsmallest(n, items, key=lambda x: x[0])[-1][0]
+        items = sorted([(s, (a.name, b.name), a, b, v) for s,a,b,v in items if s <= cut], key=lambda x: x[:2])
+        return [(s, (a, b), v) for s,_,a,b,v in items[:n]]
+
+    # Name keyed copy, for printing
+    def toDict(self):
+        return {(a.name, b.name):v for a,b,v,_ in self.entries.itervalues()}
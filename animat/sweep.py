@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import copy
+import math
+import random
+import shutil
+import itertools
+import tempfile
+from runner import runTasks
+
+# Hyperparameter search over an example config. A search space maps dotted
+# paths into the config to the values to try:
+#
+#   {"agent.network.epsilon": [0.05, 0.1, 0.2],         # choices
+#    "agent.network.q_learning_factor": (0.01, 0.5),    # uniform range
+#    "agent.network.utility_function": ["min+", "weighted"]}
+#
+# A grid takes every combination of the choices, random search samples
+# ranges and choices. Each configuration is scored on repeated episodes
+# and the results are written as a table, see writeResults.
+
+def setPath(conf, path, value):
+    keys = path.split(".")
+    for k in keys[:-1]:
+        conf = conf.setdefault(k, {})
+    conf[keys[-1]] = value
+
+def applyParams(conf, params):
+    conf = copy.deepcopy(conf)
+    for path, value in params.items():
+        setPath(conf, path, value)
+    return conf
+
+def grid(space):
+    paths = sorted(space.keys())
+    for path in paths:
+        if type(space[path]) != list:
+            raise ValueError("A grid needs a list of values for %s" % path)
+    return [dict(zip(paths, values)) for values in itertools.product(*[space[p] for p in paths])]
+
+def randomSearch(space, n, rng=random):
+    def sample(values):
+        if type(values) == list: return rng.choice(values)
+        low, high = values
+        return rng.uniform(low, high)
+    paths = sorted(space.keys())
+    return [{path:sample(space[path]) for path in paths} for _ in range(n)]
+
+def _variance(values):
+    m = sum(values) / float(len(values))
+    return sum([(x-m)**2 for x in values]) / float(len(values))
+
+# Final and integrated wellbeeing of a set of episodes, from the summaries
+# of runEpisode. An episode that died early has a final wellbeeing <= 0 and
+# integrates over fewer ticks.
+def score(summaries):
+    final = [x['final'] for x in summaries]
+    integrated = [x['integrated'] for x in summaries]
+    return {
+        'final_mean': sum(final) / len(final),
+        'final_var': _variance(final),
+        'integrated_mean': sum(integrated) / len(integrated),
+        'integrated_var': _variance(integrated),
+    }
+
+# Score every candidate (a dict of params) on repeats episodes of conf, run
+# over a pool of processes. With eta set this is successive halving: all
+# candidates get min_iterations ticks, the best 1/eta by mean integrated
+# wellbeeing go on with eta times more, until one is left or max_iterations
+# is reached. Without eta every candidate runs the config's own iterations.
+#
+# Episode i uses the same seed for every candidate, so they are compared on
+# the same random draws. Returns one row per candidate and round.
+#
+# The episodes run in a scratch directory that is removed after each round.
+# With keep_trials their output (stats.json, wellbeeing trail, ...) is kept
+# in outputPath/round-<n>/candidate-<c>/episode-<r> instead.
+def sweep(conf, candidates, outputPath, repeats=4, processes=None, seed=None,
+          eta=None, min_iterations=None, max_iterations=None, keep_trials=False):
+    rng = random.Random(seed)
+    seeds = [rng.randrange(2**31) for _ in range(repeats)]
+    max_iterations = max_iterations or conf.get("iterations", 100)
+    if eta:
+        iterations = min(min_iterations or max(1, max_iterations // eta**2), max_iterations)
+    else:
+        iterations = max_iterations
+
+    rows = []
+    alive = list(range(len(candidates)))
+    stage = 0
+    while True:
+        trialPath = outputPath if keep_trials else tempfile.mkdtemp(prefix="sweep-")
+        tasks = []
+        for c in alive:
+            trialConf = applyParams(conf, candidates[c])
+            trialConf["iterations"] = iterations
+            for r in range(repeats):
+                path = os.path.join(trialPath, "round-%d" % stage, "candidate-%d" % c, "episode-%d" % r)
+                tasks.append((trialConf, path, (c, r), seeds[r], False))
+
+        summaries = {c:[None]*repeats for c in alive}
+        try:
+            for (c, r), summary in runTasks(tasks, processes):
+                summaries[c][r] = summary
+        finally:
+            if not keep_trials: shutil.rmtree(trialPath, ignore_errors=True)
+
+        scores = {}
+        for c in alive:
+            scores[c] = score(summaries[c])
+            row = {'candidate':c, 'round':stage, 'iterations':iterations, 'repeats':repeats}
+            row.update(candidates[c])
+            row.update(scores[c])
+            rows.append(row)
+            print "SWEEP", stage, iterations, candidates[c], scores[c]
+
+        if not eta or len(alive) <= 1 or iterations >= max_iterations:
+            break
+        alive = sorted(alive, key=lambda c: -scores[c]['integrated_mean'])
+        alive = alive[:int(math.ceil(len(alive) / float(eta)))]
+        iterations = min(iterations * eta, max_iterations)
+        stage = stage + 1
+    return rows
+
+def _csvValue(v):
+    if isinstance(v, float): return unicode(v).replace(".",",")
+    return unicode(v)
+
+# The rows of sweep() as a table in the format of wellbeeing.csv, numbers
+# with a decimal comma
+def writeResults(path, rows, params):
+    columns = ['candidate', 'round', 'iterations', 'repeats'] + sorted(params) + \
+              ['final_mean', 'final_var', 'integrated_mean', 'integrated_var']
+    fp = open(path, "w")
+    print >> fp, u";".join(columns).encode("utf-8")
+    for row in rows:
+        print >> fp, u";".join([_csvValue(row.get(k, "")) for k in columns]).encode("utf-8")
+    fp.close()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import struct
+import tempfile
+import threading
+import Queue
+from collections import deque
+
+MAX_SYMBOLS = 0x10000 # ids are stored as 16 bit "H"
+
+# An append-only history that keeps at most capacity entries in memory. When
+# the buffer is full the oldest half is written to a file in path as packed
+# records, iterating reads the file back before the buffer.
+#
+# fields has one struct format character per value in an entry, or "S" for a
+# string that is stored as an index into a symbol table (cells, motor names).
+# A single field stores plain values instead of 1-tuples.
+#
+# Next to the spill file, <file>.symbols holds fields and then the symbols in
+# id order, as length-prefixed utf-8 strings, so read() can decode a spill
+# file after the run. Symbols are appended to it as they are spilled.
+#
+# Spilled entries are encoded and written by a writer thread, so the tick
+# only pays for handing them over. Reading the spill file waits for the
+# writes queued before it, errors in the writer (e.g. more than MAX_SYMBOLS
+# symbols) are raised on the next spill, read or close. The owner closes the
+# trail, see Agent.close.
+class Trail:
+    def __init__(self, fields, path=None, capacity=None, prefix="trail-"):
+        self.fields = fields
+        self.record = struct.Struct("<" + fields.replace("S", "H"))
+        self.path = path
+        self.capacity = capacity
+        self.prefix = prefix
+        self.filename = None
+        self.buffer = deque()
+        self.spilled = 0
+        self.symbols = []
+        self._symbolIds = {}
+        self._symbolsWritten = 0 # symbols in the .symbols file
+        self._queue = None
+        self._writer = None
+        self._error = None
+
+    def __len__(self):
+        return self.spilled + len(self.buffer)
+
+    def append(self, x):
+        self.buffer.append(x)
+        if self.capacity and self.path and len(self.buffer) > self.capacity:
+            self.spill(len(self.buffer) - self.capacity//2)
+
+    def __iter__(self):
+        if self.spilled:
+            self.flush()
+            for x in self._readSpilled():
+                yield x
+        for x in list(self.buffer):
+            yield x
+
+    # The last n entries, all of them are in memory as long as n <= capacity/2
+    def last(self, n):
+        if n <= 0: return []
+        if n <= len(self.buffer):
+            return list(self.buffer)[-n:]
+        return list(self)[-n:]
+
+    def spill(self, n):
+        self._check()
+        if not self.filename:
+            fd, self.filename = tempfile.mkstemp(suffix=".bin", prefix=self.prefix, dir=self.path)
+            os.close(fd)
+            _writeStrings(self.filename + ".symbols", "wb", [self.fields])
+            self._queue = Queue.Queue(4)
+            self._writer = threading.Thread(target=self._write, name=self.prefix + "writer")
+            self._writer.daemon = True
+            self._writer.start()
+        popleft = self.buffer.popleft
+        self._queue.put([popleft() for _ in xrange(n)])
+        self.spilled = self.spilled + n
+
+    # Move all entries to the spill file and return its name (None when
+    # there are none), e.g. to hand the trail to another process
+    def save(self):
+        if self.buffer: self.spill(len(self.buffer))
+        self.flush()
+        return self.filename
+
+    # Wait until everything spilled so far is in the file
+    def flush(self):
+        if self._queue: self._queue.join()
+        self._check()
+
+    def close(self):
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        self._check()
+
+    def _check(self):
+        if self._error:
+            error, self._error = self._error, None
+            raise error
+
+    def _write(self):
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None: return
+                if not self._error: self._writeChunk(chunk)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _writeChunk(self, chunk):
+        pack = self.record.pack
+        data = "".join([pack(*self._encode(x)) for x in chunk])
+        # Symbols first, so every id in the spill file can be decoded
+        if len(self.symbols) > self._symbolsWritten:
+            _writeStrings(self.filename + ".symbols", "ab", self.symbols[self._symbolsWritten:])
+            self._symbolsWritten = len(self.symbols)
+        fp = open(self.filename, "ab")
+        fp.write(data)
+        fp.close()
+
+    def _encode(self, x):
+        if len(self.fields) == 1: x = (x,)
+        values = []
+        for kind, v in zip(self.fields, x):
+            if kind == "S":
+                i = self._symbolIds.get(v)
+                if i is None:
+                    if len(self.symbols) >= MAX_SYMBOLS:
+                        raise ValueError("More than %d symbols in %s" % (MAX_SYMBOLS, self.filename))
+                    i = self._symbolIds[v] = len(self.symbols)
+                    self.symbols.append(v)
+                v = i
+            values.append(v)
+        return values
+
+    def _decode(self, values):
+        x = tuple([self.symbols[v] if kind == "S" else v for kind, v in zip(self.fields, values)])
+        if len(self.fields) == 1: return x[0]
+        return x
+
+    def _readSpilled(self):
+        size = self.record.size
+        fp = open(self.filename, "rb")
+        try:
+            while True:
+                data = fp.read(size*4096)
+                if not data: break
+                for i in xrange(0, len(data), size):
+                    yield self._decode(self.record.unpack_from(data, i))
+        finally:
+            fp.close()
+
+def _writeStrings(path, mode, strings):
+    fp = open(path, mode)
+    for x in strings:
+        x = unicode(x).encode("utf-8")
+        fp.write(struct.pack("<H", len(x)) + x)
+    fp.close()
+
+def _readStrings(path):
+    fp = open(path, "rb")
+    data = fp.read()
+    fp.close()
+    strings = []
+    offset = 0
+    while offset + 2 <= len(data):
+        size, = struct.unpack_from("<H", data, offset)
+        strings.append(data[offset+2:offset+2+size].decode("utf-8"))
+        offset = offset + 2 + size
+    return strings
+
+# The entries of a spill file written by a Trail, decoded with the symbols
+# in its .symbols file. records() reads them one block at a time.
+def records(filename):
+    strings = _readStrings(filename + ".symbols")
+    trail = Trail(strings[0])
+    trail.symbols = strings[1:]
+    trail.filename = filename
+    trail.spilled = os.path.getsize(filename) // trail.record.size
+    return trail._readSpilled()
+
+def read(filename):
+    return list(records(filename))
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import struct
+
+# Binary record of what an agent did: one fixed-size record per action with
+# the tick, the position and orientation after it, the action, the cell it
+# was taken in and the reward for every objective (NaN when not given).
+# Actions and cells are stored as indexes into name tables in the header.
+#
+# Header: MAGIC, version, then the objectives, actions and cells as
+# length-prefixed utf-8 strings. read() turns a file back into records,
+# writeCSV() and writeTurtle() export them, see playback.py. The owner
+# closes the recorder, see Environment.close.
+
+MAGIC = "ANTR"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHH") # magic, version, objectives, actions, cells
+UNKNOWN = 0xFFFF # action or cell not in the tables
+
+def _writeNames(fp, names):
+    for x in names:
+        x = x.encode("utf-8")
+        fp.write(struct.pack("<H", len(x)) + x)
+
+def _record(objectives):
+    return struct.Struct("<iiiBHH%dd" % objectives)
+
+class Recorder:
+    def __init__(self, path, objectives, actions, cells, buffering=1<<16):
+        self.objectives = list(objectives)
+        self.actions = {x:i for i,x in enumerate(actions)}
+        self.cells = {x:i for i,x in enumerate(cells)}
+        self._record = _record(len(self.objectives))
+        self.fp = open(path, "wb", buffering)
+        self.fp.write(HEADER.pack(MAGIC, VERSION, len(self.objectives), len(actions), len(cells)))
+        for names in (self.objectives, actions, cells):
+            _writeNames(self.fp, names)
+
+    def record(self, tick, agent, action, cell, reward):
+        x, y = agent.position
+        self.fp.write(self._record.pack(tick, x, y, agent.orientation,
+                                        self.actions.get(action, UNKNOWN), self.cells.get(cell, UNKNOWN),
+                                        *[reward.get(k, float('nan')) for k in self.objectives]))
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        if not self.fp.closed: self.fp.close()
+
+# The objectives of a trajectory file and a generator of its records as
+# (tick, (x, y), orientation, action, cell, reward dict), read one record at
+# a time. A cut off last record is left out.
+def load(path):
+    fp = open(path, "rb")
+    try:
+        magic, version, objectives, actions, cells = HEADER.unpack(fp.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("%s is not a trajectory file" % path)
+        if version > VERSION:
+            raise ValueError("Unsupported trajectory version %d, expected at most %d" % (version, VERSION))
+        tables = []
+        for n in (objectives, actions, cells):
+            names = []
+            for _ in xrange(n):
+                size, = struct.unpack("<H", fp.read(2))
+                names.append(fp.read(size).decode("utf-8"))
+            tables.append(names)
+        offset = fp.tell()
+    finally:
+        fp.close()
+    objectives, actions, cells = tables
+    record = _record(len(objectives))
+    def records():
+        fp = open(path, "rb")
+        try:
+            fp.seek(offset)
+            while True:
+                data = fp.read(record.size)
+                if len(data) < record.size: break
+                values = record.unpack(data)
+                tick, x, y, orientation, action, cell = values[:6]
+                reward = {k:v for k,v in zip(objectives, values[6:]) if v == v}
+                yield (tick, (x, y), orientation,
+                       actions[action] if action != UNKNOWN else None,
+                       cells[cell] if cell != UNKNOWN else None,
+                       reward)
+        finally:
+            fp.close()
+    return objectives, records()
+
+def read(path):
+    return load(path)[1]
+
+# A value for the CSV files, numbers with a decimal comma like wellbeeing.csv
+def csvValue(v):
+    if isinstance(v, float): return unicode(v).replace(".",",")
+    if v is None: return u""
+    return unicode(v)
+
+# One line per action, in the ';' separated, decimal comma format of
+# wellbeeing.csv.
+def writeCSV(path, out):
+    objectives, records = load(path)
+    fp = open(out, "w")
+    print >> fp, u";".join(["tick", "x", "y", "orientation", "action", "cell"] + objectives).encode("utf-8")
+    for tick, (x, y), orientation, action, cell, reward in records:
+        values = [tick, x, y, orientation, action, cell] + [reward.get(k) for k in objectives]
+        print >> fp, u";".join([csvValue(v) for v in values]).encode("utf-8")
+    fp.close()
+
+# A Python script that draws the trajectory with turtle graphics, what
+# "playback" used to write while running. Jumps over the edge of a torus
+# are marked with dots.
+def writeTurtle(path, out, scale=10):
+    fp = open(out, "w")
+    print >> fp, "import turtle;t = turtle.Turtle()"
+    px, py = 0, 0
+    for tick, (x, y), orientation, action, cell, reward in read(path):
+        if action in ('up', 'down', 'right', 'left'):
+            wrap = abs(x-px) > 1 or abs(y-py) > 1
+            if wrap: print >> fp, "t.color((1,0,0));t.dot(3);t.penup()"
+            print >> fp, "t.setpos(%d,%d)" % (x*scale, y*scale)
+            if wrap: print >> fp, "t.pendown();t.color((1,1,0));t.dot(3);t.color((0,0,0))"
+        elif action == 'turn_right':
+            print >> fp, "t.right(90)"
+        elif action == 'turn_left':
+            print >> fp, "t.left(90)"
+        elif action == 'eat':
+            print >> fp, "t.color((0,1,0));t.dot(5);t.color((0,0,0))"
+        elif action == 'drink':
+            print >> fp, "t.color((0,0,1));t.dot(5);t.color((0,0,0))"
+        px, py = x, y
+    fp.close()
+
+EXPORTERS = {'csv':writeCSV, 'turtle':writeTurtle}
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Simulation speed benchmarks.
+#
+#   python benchmarks/bench.py                       all missions and stress cases
+#   python benchmarks/bench.py --quick               fewer ticks, smaller networks
+#   python benchmarks/bench.py --sizes 100 100000    pick the network sizes
+#   python benchmarks/bench.py --compare old.json    print the change against a saved run
+#
+# Every run is saved as JSON in benchmarks/results/ (or --out).
+
+import os
+import sys
+import json
+import glob
+import random
+import argparse
+import datetime
+import platform
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from animat.environment import *
+from animat.nodes import *
+from animat.stats import timer
+
+# Environments write trails and logs here
+OUTPUT = os.path.join(ROOT, "output", "bench-" + datetime.datetime.now().isoformat())
+
+# Latency statistics of a list of durations, in seconds
+def stats(samples):
+    xs = sorted(samples)
+    n = len(xs)
+    if n == 0: return {'n':0}
+    def p(q): return xs[min(n-1, int(q*n))]
+    total = sum(xs)
+    return {
+        'n': n,
+        'per_sec': n/total if total > 0 else None,
+        'mean': total/n,
+        'p50': p(0.50),
+        'p90': p(0.90),
+        'p99': p(0.99),
+        'max': xs[-1],
+    }
+
+def timed(f, n):
+    samples = []
+    for _ in xrange(n):
+        t = timer()
+        f()
+        samples.append(timer() - t)
+    return stats(samples)
+
+def propagationModes():
+    modes = ["recursive", "incremental"]
+    try:
+        import numpy
+        modes.append("compiled")
+    except ImportError:
+        pass
+    return modes
+
+# Whole-agent ticks of an example mission, like main.py runs them
+def benchMission(path, ticks, mode, seed=1):
+    conf = json.load(open(path))
+    conf['agent'].setdefault('network', {})['propagation'] = mode
+    random.seed(seed)
+    config = EnvironmentConfig(conf, os.path.join(OUTPUT, "missions"))
+    env = VirtualEnvironment(config)
+    agent = env.createAgent(config.agent)
+    samples = []
+    for i in xrange(ticks):
+        t = timer()
+        env.tick()
+        samples.append(timer() - t)
+        if agent.wellbeeing() <= 0.0: break
+    env.close()
+    result = stats(samples)
+    result['nodes'] = len(agent.network.nodes)
+    return result
+
+# A world of random cells, an agent on top of a network pre-grown to size
+# nodes. New nodes are AND/SEQ nodes on two random real nodes, at most
+# maxLevel levels up so names and ancestor sets stay realistic.
+def makeStress(size, sensors, motors, objectives, worldSize, mode, maxLevel=4, seed=1):
+    rng = random.Random(seed)
+    cells = "abcdefghij"
+    sensorNames = ["s%d" % i for i in range(sensors)]
+    conf = {
+        "world": "\n".join(["".join([rng.choice(cells) for x in range(worldSize)]) for y in range(worldSize)]),
+        "objectives": ["o%d" % i for i in range(objectives)],
+        "blocks": {c:{s:rng.randint(0, 1) for s in sensorNames} for c in cells},
+        "rewards": {"*":{c:{("o%d" % i):rng.uniform(-0.05, 0.05) for i in range(objectives)} for c in cells}},
+        "iterations": 1,
+        "torus": True,
+        "agent": {
+            "network": {
+                "sensors": sensorNames,
+                "motors": ["up", "down", "left", "right"] + ["m%d" % i for i in range(motors-4)],
+                "propagation": mode,
+            },
+        },
+    }
+    random.seed(seed)
+    config = EnvironmentConfig(conf, os.path.join(OUTPUT, "stress"))
+    env = VirtualEnvironment(config)
+    agent = env.createAgent(config.agent)
+    network = agent.network
+
+    low = list(network.sensors) # nodes new nodes can be put on top of
+    while len(network.nodes) < size:
+        a, b = rng.sample(low, 2)
+        if rng.random() < 0.5:
+            if network.hasAndNode([a, b]): continue
+            n = AndNode(inputs=[a, b])
+        else:
+            if network.hasSeqNode([a, b]): continue
+            n = SEQNode(inputs=[a, b])
+        network.addNode(n)
+        if n.level < maxLevel: low.append(n)
+    return env, agent
+
+def benchStress(size, sensors, motors, objectives, worldSize, mode, ticks):
+    t = timer()
+    env, agent = makeStress(size, sensors, motors, objectives, worldSize, mode)
+    build = timer() - t
+    network = agent.network
+    motorNames = [m.name for m in network.motors]
+    reward = {k:0.01 for k in network.objectives}
+
+    def tick():
+        agent.position = (random.randrange(worldSize), random.randrange(worldSize))
+        network.tick()
+    def bestAction():
+        network.getBestAction(agent.needs)
+    def surprise():
+        agent._updateSurpriseMatrix(0.0, reward, motorNames[0], 0)
+        agent._previousTopNodes = network.activeTopNodes()
+    def takeAction():
+        env.takeAction(agent, random.choice(motorNames))
+
+    result = {
+        'nodes': len(network.nodes),
+        'sensors': sensors, 'motors': motors, 'objectives': objectives,
+        'world': worldSize, 'propagation': mode,
+        'build_sec': build,
+        'top_active': len(network.activeTopNodes()),
+        'Network.tick': timed(tick, ticks),
+        'getBestAction': timed(bestAction, ticks),
+        '_updateSurpriseMatrix': timed(surprise, ticks),
+        'takeAction': timed(takeAction, ticks),
+    }
+    env.close()
+    return result
+
+def gitRevision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(results):
+    rows = {}
+    for name, r in results['missions'].items():
+        rows["mission %s" % name] = r['mean']
+    for r in results['stress']:
+        key = "stress n=%d s=%d m=%d o=%d w=%d %s" % (r['nodes'], r['sensors'], r['motors'], r['objectives'], r['world'], r['propagation'])
+        for f in ('Network.tick', 'getBestAction', '_updateSurpriseMatrix', 'takeAction'):
+            rows["%s %s" % (key, f)] = r[f]['mean']
+    return rows
+
+def compare(old, new):
+    a, b = flatten(old), flatten(new)
+    print
+    print "%-80s %12s %12s %8s" % ("mean latency", "before", "after", "ratio")
+    for k in sorted(set(a) & set(b)):
+        print "%-80s %12.6f %12.6f %8.2f" % (k, a[k], b[k], b[k]/a[k] if a[k] else 0.0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Animat simulation benchmarks")
+    parser.add_argument("--quick", action="store_true", help="fewer ticks and smaller networks")
+    parser.add_argument("--ticks", type=int, help="ticks per measurement")
+    parser.add_argument("--sizes", type=int, nargs="+", help="stress network sizes")
+    parser.add_argument("--modes", nargs="+", help="propagation modes")
+    parser.add_argument("--skip-missions", action="store_true")
+    parser.add_argument("--skip-stress", action="store_true")
+    parser.add_argument("--out", help="result file, default benchmarks/results/<time>.json")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    ticks = args.ticks or (100 if args.quick else 1000)
+    sizes = args.sizes or ([100, 1000] if args.quick else [100, 1000, 10000, 100000])
+    modes = args.modes or propagationModes()
+
+    results = {
+        'time': datetime.datetime.now().isoformat(),
+        'revision': gitRevision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'ticks': ticks,
+        'missions': {},
+        'stress': [],
+    }
+
+    if not args.skip_missions:
+        for path in sorted(glob.glob(os.path.join(ROOT, "examples", "*.json"))):
+            for mode in modes:
+                name = "%s %s" % (os.path.basename(path), mode)
+                r = results['missions'][name] = benchMission(path, ticks, mode)
+                print "%-40s %8.1f ticks/s  p50 %.6f  p99 %.6f  %d nodes" % (name, r['per_sec'], r['p50'], r['p99'], r['nodes'])
+
+    if not args.skip_stress:
+        cases = [(size, 8, 6, 2, 100) for size in sizes]
+        # Wide networks and big worlds at a moderate size
+        cases.append((1000, 64, 6, 2, 100))
+        cases.append((1000, 8, 32, 2, 100))
+        cases.append((1000, 8, 6, 16, 100))
+        cases.append((1000, 8, 6, 2, 2000))
+        for size, sensors, motors, objectives, worldSize in cases:
+            for mode in modes:
+                r = benchStress(size, sensors, motors, objectives, worldSize, mode, ticks)
+                results['stress'].append(r)
+                print "stress n=%-6d s=%-3d m=%-3d o=%-3d w=%-5d %-11s build %.1fs" % (
+                    r['nodes'], sensors, motors, objectives, worldSize, mode, r['build_sec']),
+                for f in ('Network.tick', 'getBestAction', '_updateSurpriseMatrix', 'takeAction'):
+                    print " %s %.6f" % (f, r[f]['mean']),
+                print
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", results['time'].replace(":", "-") + ".json")
+    if not os.path.isdir(os.path.dirname(out)):
+        os.makedirs(os.path.dirname(out))
+    json.dump(results, open(out, "w"), indent=1, sort_keys=True)
+    print "Saved", out
+
+    if args.compare:
+        compare(json.load(open(args.compare)), results)
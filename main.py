@@ -17,13 +17,15 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from animat.environment import *
-from animat.nodes import *
-import animat.agent
+from animat.runner import runEpisodes, writeWellbeeing
 import json
-from pprint import pprint
 
 # Set this to a higher number to repeat the experiment and average wellbeeing
 N_REPEATS = 1
+# Worker processes for the repeats, None uses all cores
+N_PROCESSES = None
+# Seed for the episode seeds, None for a different run every time
+SEED = None
 
 if __name__ == "__main__":
 #    conf = json.load(file("examples/example-1-copepod.json"))
@@ -34,32 +36,11 @@ if __name__ == "__main__":
     config = EnvironmentConfig(conf)
     print conf
 
-    wellbeeings = []
+    # Only for the first episode, dump the network, trail and surprise matrices.
+    wellbeeings = {}
+    for episode, summary in runEpisodes(conf, config.outputPath, N_REPEATS, N_PROCESSES, SEED, dump=True):
+        print "EPISODE", episode, "done,", len(wellbeeings)+1, "of", N_REPEATS
+        wellbeeings[episode] = summary
 
-    for episode in range(N_REPEATS):
-        env = VirtualEnvironment(config)
-        agent = env.createAgent(config.agent)
-
-        for i in range(config.maxIterations):
-            env.tick()
-            if agent.wellbeeing() <= 0.0:
-                print "DEAD!"
-                break
-
-        # Only for the first episode, dump the network, trail and surprise matrices.
-        if episode == 0:
-            agent.network.printNetwork()
-            env.printWorld()
-            for i,x in enumerate(agent.trail):
-                print i, x[0], x[1]
-            print "SURPRISE MATRIX"
-            pprint(agent.surpriseMatrix)
-            print "SEQ SURPRISE MATRIX"
-            pprint(agent.surpriseMatrix_SEQ)
-
-        wellbeeings.append(agent.wellbeeingTrail)
-
-    # Save the wellbeeing trails to file
-    fp = open( os.path.join(config.outputPath, "wellbeeing.csv"), "w")
-    print >> fp, "\n".join([";".join([str(x).replace(".",",") for x in line]) for line in zip(*wellbeeings)])
-    fp.close()
+    # Save the wellbeeing trails to file, streamed from the episode files
+    writeWellbeeing(os.path.join(config.outputPath, "wellbeeing.csv"), [wellbeeings[k] for k in sorted(wellbeeings)])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from animat import trajectory
+import os
+import sys
+
+# Export the trajectory.bin an episode with "playback" on wrote:
+#
+#   python playback.py output/.../trajectory.bin [turtle|csv]
+#
+# turtle writes playback_script.py next to it, run it with python to watch
+# the agent move. csv writes trajectory.csv.
+OUTPUT = {'turtle':"playback_script.py", 'csv':"trajectory.csv"}
+
+if __name__ == "__main__":
+    path = sys.argv[1]
+    format = sys.argv[2] if len(sys.argv) > 2 else 'turtle'
+    out = os.path.join(os.path.dirname(path), OUTPUT[format])
+    trajectory.EXPORTERS[format](path, out)
+    print "Wrote", out
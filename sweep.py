@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from animat.environment import *
+from animat.sweep import *
+import json
+
+# Parameters to tune, as dotted paths into the example config. Lists are
+# choices, tuples are uniform ranges (random search only).
+SPACE = {
+    "agent.network.epsilon": [0.05, 0.1, 0.2],
+    "agent.network.q_learning_factor": [0.05, 0.1, 0.3],
+    "agent.network.q_discount_factor": [0.3, 0.5, 0.8],
+    "agent.network.reward_learning_factor": [0.3, 0.5],
+    "agent.surprise_const": [1.0, 2.0],
+    "agent.network.utility_function": ["min+", "weighted"],
+    "agent.network.q_function": ["mean", "weighted"],
+}
+# Number of random samples from SPACE, None runs the full grid
+N_RANDOM = 50
+# Episodes per configuration
+N_REPEATS = 4
+# Worker processes, None uses all cores
+N_PROCESSES = None
+SEED = 1
+# Successive halving: keep the best 1/ETA each round, None to run everything
+# for the full number of iterations
+ETA = 3
+# Keep the output of every episode, not only sweep.csv
+KEEP_TRIALS = False
+
+if __name__ == "__main__":
+    conf = json.load(file("examples/example-2-sheep.json"))
+    config = EnvironmentConfig(conf)
+
+    if N_RANDOM:
+        candidates = randomSearch(SPACE, N_RANDOM, random.Random(SEED))
+    else:
+        candidates = grid(SPACE)
+    rows = sweep(conf, candidates, config.outputPath, N_REPEATS, N_PROCESSES, SEED, ETA,
+                 keep_trials=KEEP_TRIALS)
+    writeResults(os.path.join(config.outputPath, "sweep.csv"), rows, SPACE.keys())
+
+    best = [row for row in rows if row['round'] == rows[-1]['round']]
+    best = sorted(best, key=lambda row: -row['integrated_mean'])[0]
+    print "BEST", {k:best[k] for k in SPACE}, best['integrated_mean']
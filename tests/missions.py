@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Run an example mission from examples/ in a scratch output directory, for
+# comparing runs of the same seed under different settings.
+
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat.environment import *
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "examples")
+
+# The swamp mission set up to grow AND and SEQ nodes quickly, and to prune
+# them again once the network has more than 10 nodes
+GROWING = ("example-3-swamp.json",
+           {"surprise_const": 0.1, "features": {"AND": 1, "SEQ": 1}},
+           {"max_nodes": 10, "prune_min_age": 20})
+
+def load(example, agent=None, network=None):
+    conf = json.load(open(os.path.join(EXAMPLES, example)))
+    conf.pop("playback", None)
+    conf.pop("log", None)
+    conf["agent"].update(agent or {})
+    conf["agent"].setdefault("network", {}).update(network or {})
+    return conf
+
+# Ticks the mission of conf, calling each(env, agent) after every tick.
+# Returns the results of each, the agent's wellbeeing trail and its event
+# counters.
+def run(conf, ticks, each, seed=1):
+    path = tempfile.mkdtemp(prefix="animat-test-")
+    try:
+        random.seed(seed)
+        config = EnvironmentConfig(conf, path)
+        env = VirtualEnvironment(config)
+        agent = env.createAgent(config.agent)
+        try:
+            states = []
+            for i in range(ticks):
+                env.tick()
+                states.append(each(env, agent))
+            return states, list(agent.wellbeeingTrail), agent.stats.counters
+        finally:
+            env.close()
+    finally:
+        shutil.rmtree(path)
+
+# Names of the active nodes, and the last action taken
+def activity(env, agent):
+    return (sorted([x.name for x in agent.network.nodes.values() if x.active]), agent.trail.last(1))
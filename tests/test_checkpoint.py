@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(__file__))
+import missions
+from animat.environment import *
+from animat import checkpoint
+
+# What the next tick depends on, as far as it can be compared by value. The
+# trails are not part of a checkpoint.
+def state(agent):
+    network = agent.network
+    return (sorted([x.name for x in network.nodes.values() if x.active]),
+            agent.wellbeeing(), sorted(agent.needs.items()), agent.position,
+            sorted([(x.name, x.rewardHistory) for x in network.nodes.values()]),
+            sorted([(k, a.triggers, sorted(a.Q.items()), a.rewardHistory) for k,a in network.actions.items()]))
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="animat-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def start(self, conf, name):
+        config = EnvironmentConfig(conf, os.path.join(self.path, name))
+        env = VirtualEnvironment(config)
+        return env, env.createAgent(config.agent)
+
+    # Save mid-episode, restore into a new agent and check that the next
+    # ticks are the same as those of the original
+    def checkContinues(self, conf, before, after):
+        random.seed(1)
+        env, agent = self.start(conf, "original")
+        for i in range(before):
+            env.tick()
+        data = checkpoint.dumps(agent)
+        saved = state(agent)
+        expected = []
+        for i in range(after):
+            env.tick()
+            expected.append((state(agent), agent.trail.last(1)))
+        env.close()
+
+        random.seed(2)
+        env, agent = self.start(conf, "restored")
+        checkpoint.restore(agent, checkpoint.loads(data))
+        self.assertEqual(state(agent), saved)
+        for i in range(after):
+            env.tick()
+            self.assertEqual((state(agent), agent.trail.last(1)), expected[i], "differs %d ticks after the restore" % (i+1))
+        env.close()
+
+    def testSheep(self):
+        self.checkContinues(missions.load("example-2-sheep.json"), 150, 100)
+
+    # Grown, pruned and reused ids
+    def testGrowing(self):
+        for store in ("dict", "numpy"):
+            conf = missions.load(missions.GROWING[0], missions.GROWING[1], dict(missions.GROWING[2], q_store=store))
+            self.checkContinues(conf, 250, 150)
+
+if __name__ == "__main__":
+    unittest.main()
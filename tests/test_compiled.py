@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from missions import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Every node's activation and activation count, and the last action taken
+def activations(env, agent):
+    nodes = sorted(agent.network.nodes.values(), key=lambda x: x.name)
+    return ([(x.name, x.active, x.activations) for x in nodes], agent.trail.last(1))
+
+@unittest.skipIf(numpy is None, "the compiled evaluator needs numpy")
+class CompiledTest(unittest.TestCase):
+    def compare(self, example, agent=None, network=None, ticks=500):
+        runs = {}
+        for mode in ("recursive", "compiled"):
+            runs[mode] = run(load(example, agent, dict(network or {}, propagation=mode)), ticks, activations)
+        states, trail, counters = runs["recursive"]
+        for i, (a, b) in enumerate(zip(states, runs["compiled"][0])):
+            self.assertEqual(a, b, "tick %d" % (i+1))
+        self.assertEqual(runs["compiled"][1], trail)
+        return counters
+
+    def testExamples(self):
+        for example in ("example-1-copepod.json", "example-2-sheep.json", "example-4-seq.json"):
+            self.compare(example)
+
+    # The compiled form is rebuilt as nodes are grown and pruned
+    def testGrowing(self):
+        counters = self.compare(*GROWING)
+        for x in ("grownAND", "grownSEQ", "pruned"):
+            self.assertTrue(counters.get(x, 0) > 0, x)
+
+if __name__ == "__main__":
+    unittest.main()
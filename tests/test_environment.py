@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat.environment import *
+
+class SensorMaskTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="animat-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def makeEnvironment(self, sensors):
+        conf = {
+            "world": "ab.\n.ba\nbb.",
+            "blocks": {"a": {"s0": 1}, "b": {"s1": 1, sensors[-1]: 1}},
+            "objectives": ["water"],
+            "agent": {"network": {"sensors": sensors, "motors": ["eat"]}},
+        }
+        config = EnvironmentConfig(conf, self.path)
+        env = VirtualEnvironment(config)
+        env.createAgent(config.agent)
+        return env
+
+    # Every cell's mask has bit j set when readSensor gives sensor j
+    def checkMasks(self, env):
+        for y in range(env.height):
+            for x in range(env.width):
+                env.agent.position = (x, y)
+                mask = env.sensorMask()
+                for j, sensor in enumerate(env.sensors):
+                    self.assertEqual(bool(mask & (1 << j)), bool(env.readSensor(sensor)), (x, y, sensor))
+
+    def testPatched(self):
+        for n in (3, 12, 70):
+            env = self.makeEnvironment(["t"] + ["s%d" % j for j in range(n-1)])
+            self.checkMasks(env)
+            env.agent.position = (0, 0)
+            env.setCurrentCell("b")
+            env.agent.position = (2, 2)
+            env.setCurrentCell("a")
+            self.checkMasks(env)
+            env.reset()
+            self.checkMasks(env)
+            env.setChanges({1: ".", 4: "a"})
+            self.checkMasks(env)
+            env.close()
+
+class RewardTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="animat-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    # The reward tables are shared by every step and agent of a config
+    def testRewardIsCopied(self):
+        conf = {
+            "world": "ab",
+            "objectives": ["water"],
+            "rewards": {"eat": {"a": {"water": 0.5}, "*": -0.1}},
+            "transform": {"eat": {"a": "b"}},
+            "agent": {"network": {"sensors": ["t"], "motors": ["eat"]}},
+        }
+        config = EnvironmentConfig(conf, self.path)
+        env = VirtualEnvironment(config)
+        agent = env.createAgent(config.agent)
+        reward = env.takeAction(agent, "eat")
+        self.assertEqual(reward, {"water": 0.5})
+        self.assertEqual(env.currentCell(), "b")
+        reward["water"] = 0.0
+        env.setCurrentCell("a")
+        self.assertEqual(env.takeAction(agent, "eat"), {"water": 0.5})
+        self.assertEqual(env.takeAction(agent, "eat"), {"water": -0.1})
+        env.close()
+
+if __name__ == "__main__":
+    unittest.main()
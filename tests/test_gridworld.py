@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat import gridworld
+
+class FromRowsTest(unittest.TestCase):
+    def testRectangle(self):
+        world = gridworld.fromRows(u"abc\ncab".split("\n"))
+        self.assertEqual((world.width, world.height), (3, 2))
+        self.assertEqual(world.symbols, ["a", "b", "c"])
+        self.assertEqual(world.rows(), [["a", "b", "c"], ["c", "a", "b"]])
+        self.assertEqual(world.get(2, 1), "b")
+
+    def testTrailingNewline(self):
+        world = gridworld.fromRows("ab\nba\n".split("\n"))
+        self.assertEqual(world.rows(), [["a", "b"], ["b", "a"]])
+
+    def testRagged(self):
+        world = gridworld.fromRows(["abc", "a", "", "ab"])
+        F = gridworld.FILLER
+        self.assertEqual(world.rows(), [["a", "b", "c"], ["a", F, F], [F, F, F], ["a", "b", F]])
+
+    def testSymbolLists(self):
+        world = gridworld.fromRows([["grass", u"vatten"], ["grass"]])
+        self.assertEqual(world.rows(), [["grass", u"vatten"], ["grass", gridworld.FILLER]])
+
+    def testLimits(self):
+        self.assertRaises(ValueError, gridworld.fromRows, [])
+        self.assertRaises(ValueError, gridworld.fromRows, ["", ""])
+        self.assertRaises(ValueError, gridworld.fromRows, [[str(i) for i in range(257)]])
+        self.assertEqual(len(gridworld.fromRows([[str(i) for i in range(256)]]).symbols), 256)
+
+class FileTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="animat-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testRoundTrip(self):
+        rows = [u"aåb", u"b.a", u"..å"]
+        path = os.path.join(self.path, "world.grid")
+        gridworld.save(path, rows)
+        world = gridworld.load(path)
+        self.assertEqual((world.width, world.height), (3, 3))
+        self.assertEqual(world.rows(), [list(x) for x in rows])
+        again = os.path.join(self.path, "again.grid")
+        gridworld.save(again, world)
+        self.assertEqual(open(path, "rb").read(), open(again, "rb").read())
+
+    def testNotAGrid(self):
+        path = os.path.join(self.path, "world.grid")
+        open(path, "wb").write("not a grid world file")
+        self.assertRaises(ValueError, gridworld.load, path)
+
+class OverlayTest(unittest.TestCase):
+    def testChanges(self):
+        base = gridworld.fromRows(["ab", "ba"])
+        world = gridworld.Overlay(base)
+        world.set(1, "a")
+        world.set(2, "c")
+        self.assertEqual(world.rows(), [["a", "a"], ["c", "a"]])
+        self.assertEqual(base.rows(), [["a", "b"], ["b", "a"]])
+        self.assertEqual(world.diff(), [(1, 0, "b", "a"), (0, 1, "b", "c")])
+        # Back to the base cell is no change
+        world.set(1, "b")
+        self.assertEqual(world.diff(), [(0, 1, "b", "c")])
+        world.reset()
+        self.assertEqual(world.changes, {})
+        self.assertEqual(world.rows(), base.rows())
+        world.setChanges({0: "b", 3: "a", 2: "c"})
+        self.assertEqual(world.diff(), [(0, 0, "a", "b"), (0, 1, "b", "c")])
+
+if __name__ == "__main__":
+    unittest.main()
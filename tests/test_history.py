@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat.history import RewardHistory
+
+class RewardHistoryTest(unittest.TestCase):
+    def testRing(self):
+        h = RewardHistory(["water", "energy"], 3, capacity=1)
+        a = h.allocate()
+        b = h.allocate()
+        self.assertEqual(h.last(a), [])
+        self.assertEqual(h.mean(a), {"water": 0.0, "energy": 0.0})
+        for x in range(5):
+            h.append(a, {"water": float(x)})
+        h.append(b, {"energy": 1.0})
+        self.assertEqual(h.count(a), 3)
+        self.assertEqual(h.last(a), [{"water": 2.0}, {"water": 3.0}, {"water": 4.0}])
+        self.assertEqual(h.last(a, 2), [{"water": 3.0}, {"water": 4.0}])
+        self.assertEqual(h.last(b), [{"energy": 1.0}])
+        h.release(a)
+        self.assertEqual(h.allocate(), a)
+        self.assertEqual(h.last(a), [])
+
+    # Objectives missing from a reward are left out of the summaries
+    def testSummaries(self):
+        h = RewardHistory(["water", "energy"], 4)
+        slot = h.allocate()
+        for r in ({"water": 1.0, "energy": 2.0}, {"water": 3.0}, {"water": 5.0}):
+            h.append(slot, r)
+        self.assertEqual(h.mean(slot), {"water": 3.0, "energy": 2.0})
+        self.assertEqual(h.variance(slot, "water"), 8.0/3)
+        self.assertEqual(h.variance(slot, "energy"), 0.0)
+        self.assertEqual(h.mean(slot, "water", 2), 4.0)
+
+    def testUnknownObjective(self):
+        h = RewardHistory(["water"], 4)
+        slot = h.allocate()
+        self.assertRaises(ValueError, h.append, slot, {"glucose": 1.0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(__file__))
+import missions
+from animat.environment import *
+from animat import journal
+
+# The structure and action values replay() rebuilds
+def structure(network):
+    return (sorted([(x.getId(), x.name, x.virtual, x.permanent) for x in network.nodes.values()]),
+            sorted(network._freeIds),
+            sorted([(k, a.triggers, sorted(a.R.items()), sorted(a.Q.items()),
+                     sorted(a.minQ.items()), sorted(a.maxQ.items())) for k,a in network.actions.items()]))
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="animat-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def start(self, conf, name):
+        config = EnvironmentConfig(conf, os.path.join(self.path, name))
+        env = VirtualEnvironment(config)
+        return env, env.createAgent(config.agent)
+
+    # Replaying the journal up to a tick gives the network the agent that
+    # wrote it had at the end of that tick
+    def checkReplay(self, snapshotEvery, ticks, at):
+        for store in ("dict", "numpy"):
+            network = dict(missions.GROWING[2], q_store=store, journal=True, journal_snapshot_every=snapshotEvery)
+            conf = missions.load(missions.GROWING[0], missions.GROWING[1], network)
+            random.seed(1)
+            env, agent = self.start(conf, "original")
+            expected = {}
+            for i in range(ticks):
+                env.tick()
+                if agent.network.time in at:
+                    expected[agent.network.time] = structure(agent.network)
+            path = agent.network.journal.path
+            env.close()
+            self.assertTrue(agent.stats.counters.get("grownAND") and agent.stats.counters.get("pruned"))
+
+            for tick in at:
+                env, replayed = self.start(conf, "replay-%d" % tick)
+                journal.replay(replayed, path, tick)
+                self.assertEqual(structure(replayed.network), expected[tick], "%s differs at %d" % (store, tick))
+                env.close()
+
+    def testReplay(self):
+        self.checkReplay(0, 400, [1, 90, 250, 400])
+
+    def testReplayFromSnapshot(self):
+        self.checkReplay(100, 400, [99, 100, 101, 250, 400])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import unittest
+from array import array
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat.network import *
+from animat.nodes import *
+from animat.sensor import SensorNode
+from animat.motor import Motor
+
+def makeNetwork(**conf):
+    conf.setdefault("sensors", ["1", "2"])
+    conf.setdefault("motors", ["eat"])
+    config = NetworkConfig(conf)
+    sensors = [SensorNode("$"+x, lambda t: 0) for x in config.sensors]
+    return Network(config, sensors, [Motor(x) for x in config.motors], ["water"])
+
+class DeleteNodeTest(unittest.TestCase):
+    # A SEQ on the same node twice, e.g. SEQ($1, $1)
+    def testSeqOnSameInput(self):
+        network = makeNetwork()
+        s1 = network.sensors[0]
+        seq = SEQNode(inputs=[s1, s1])
+        network.addNode(seq)
+        self.assertEqual(s1.outputs, [seq])
+        self.assertEqual(s1.realOutputCount, 2)
+        self.assertTrue(network.deleteNode(seq))
+        self.assertEqual(s1.outputs, [])
+        self.assertEqual(s1.realOutputCount, 0)
+        self.assertTrue(s1 in network.topNodes())
+
+    def testPruneSeqOnSameInput(self):
+        network = makeNetwork(max_nodes=3, prune_ratio=0.5, prune_min_age=0)
+        s1, s2 = network.sensors
+        a = AndNode(inputs=[s1, s2])
+        network.addNode(a)
+        seq = SEQNode(inputs=[a, a])
+        network.addNode(seq)
+        removed = network.prune()
+        self.assertEqual(removed, [seq, a])
+        self.assertFalse(network.hasNode(a))
+        self.assertEqual(s1.outputs, [])
+        self.assertEqual(s1.realOutputCount, 0)
+
+class AdjacencyTest(unittest.TestCase):
+    def testIds(self):
+        network = makeNetwork()
+        s1, s2 = network.sensors
+        a = AndNode(inputs=[s1, s2])
+        network.addNode(a)
+        seq = SEQNode(inputs=[a, a])
+        network.addNode(seq)
+        self.assertEqual(network.inputIds[seq.getId()], array('i', [a.getId(), a.getId()]))
+        self.assertEqual(network.outputIds[a.getId()], array('i', [seq.getId()]))
+        self.assertEqual(s1.outputs, [a])
+        self.assertEqual(a.outputs, [seq])
+
+    # Ids, history slots and QTable rows are reused, a deleted node must not
+    # read someone else's
+    def testDeletedNodeFails(self):
+        for store in ("dict", "numpy"):
+            network = makeNetwork(q_store=store)
+            s1, s2 = network.sensors
+            a = AndNode(inputs=[s1, s2])
+            network.addNode(a)
+            action = a.actions[0]
+            network.deleteNode(a)
+            b = AndNode(inputs=[s2, s1], permanent=True, name="b")
+            network.addNode(b)
+            self.assertRaises(AssertionError, a.getId)
+            self.assertRaises(AssertionError, lambda: a.outputs)
+            self.assertRaises(AssertionError, lambda: a.rewardHistory)
+            self.assertRaises(AssertionError, action.getId)
+            if store == "numpy":
+                self.assertRaises(AssertionError, lambda: action.triggers)
+                self.assertRaises(AssertionError, action.getQ, "water")
+
+class EvaluationTest(unittest.TestCase):
+    # Recursive propagation counts the nodes it evaluated, each one once
+    def testRecursiveCount(self):
+        network = makeNetwork()
+        s1, s2 = network.sensors
+        a = AndNode(inputs=[s1, s2])
+        network.addNode(a)
+        network.addNode(SEQNode(inputs=[a, s1]))
+        network.tick()
+        self.assertEqual(network.evaluations, 4)
+        self.assertEqual(a.tick(network.time), 0)
+        network.tick()
+        self.assertEqual(network.evaluations, 8)
+
+class AncestryTest(unittest.TestCase):
+    # The labels must agree with a walk down the inputs, also after ids have
+    # been reused
+    def testIsParent(self):
+        network = makeNetwork(sensors=["1", "2", "3"])
+        s1, s2, s3 = network.sensors
+        a = AndNode(inputs=[s1, s2])
+        network.addNode(a)
+        b = AndNode(inputs=[s2, s3])
+        network.addNode(b)
+        network.deleteNode(b)
+        c = SEQNode(inputs=[a, s3])
+        network.addNode(c)
+        d = AndNode(inputs=[c, s2])
+        network.addNode(d)
+        nodes = [s1, s2, s3, a, c, d]
+        def walk(x, y):
+            return x is y or any(walk(i, y) for i in x.inputs)
+        for x in nodes:
+            for y in nodes:
+                self.assertEqual(x.isParent(y), walk(x, y), (x.name, y.name))
+
+if __name__ == "__main__":
+    unittest.main()
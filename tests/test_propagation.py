@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from missions import *
+
+class PropagationTest(unittest.TestCase):
+    # Incremental propagation only re-evaluates what changed, it has to end
+    # up in the same state as ticking every node, while nodes are grown and
+    # pruned.
+    def testIncrementalMatchesRecursive(self):
+        example, agent, network = GROWING
+        runs = {}
+        for mode in ("recursive", "incremental"):
+            network = dict(network, propagation=mode)
+            runs[mode] = run(load(example, agent, network), 500, activity)
+        states, trail, counters = runs["recursive"]
+        for i, (a, b) in enumerate(zip(states, runs["incremental"][0])):
+            self.assertEqual(a, b, "tick %d" % (i+1))
+        self.assertEqual(runs["incremental"][1], trail)
+        self.assertEqual(runs["incremental"][2], counters)
+        # Only a test if the network has changed
+        for x in ("grownAND", "grownSEQ", "pruned"):
+            self.assertTrue(counters.get(x, 0) > 0, x)
+
+if __name__ == "__main__":
+    unittest.main()
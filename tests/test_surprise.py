@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat.surprise import SurpriseMatrix
+from animat.node import Node
+
+def makeNodes(names):
+    nodes = [Node(name=x) for x in names]
+    for i,x in enumerate(nodes):
+        x.n_id = i
+    return nodes
+
+class SurpriseMatrixTest(unittest.TestCase):
+    def testLeastSurprisedTies(self):
+        c, a, b = makeNodes(["c", "a", "b"])
+        m = SurpriseMatrix()
+        m.set(c, a, {"water": 1.0}, 0)
+        m.set(b, a, {"water": 1.0}, 1)
+        m.set(a, c, {"water": 2.0}, 2)
+        m.set(a, b, {"water": 0.0}, 3)
+        score = lambda v: abs(v["water"] - 1.0)
+        self.assertEqual(m.leastSurprised(score, 2), [(0.0, (b, a), {"water": 1.0}),
+                                                      (0.0, (c, a), {"water": 1.0})])
+        self.assertEqual([x[1] for x in m.leastSurprised(score, 10)], [(b, a), (c, a), (a, b), (a, c)])
+        self.assertEqual(SurpriseMatrix().leastSurprised(score), [])
+
+    def testEviction(self):
+        nodes = makeNodes([str(x) for x in range(10)])
+        unbounded = SurpriseMatrix()
+        bounded = SurpriseMatrix(capacity=10, ratio=0.5)
+        for t,b in enumerate(nodes[1:]):
+            for m in (unbounded, bounded):
+                m.set(nodes[0], b, {}, t)
+                m.set(b, nodes[0], {}, t)
+                m.evict()
+        self.assertEqual(len(unbounded), 18)
+        self.assertTrue(len(bounded) <= 10)
+        self.assertEqual(bounded.get(nodes[0], nodes[9], {}), {})
+        self.assertEqual(bounded.get(nodes[0], nodes[1]), None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat import trail
+from animat.trail import Trail
+
+class TrailTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testSpill(self):
+        t = Trail("d", self.path, 10)
+        values = [float(x) for x in range(95)]
+        for x in values:
+            t.append(x)
+        self.assertTrue(t.spilled > 0)
+        self.assertTrue(len(t.buffer) <= 10)
+        self.assertEqual(len(t), 95)
+        self.assertEqual(list(t), values)
+        self.assertEqual(t.last(3), values[-3:])
+        self.assertEqual(t.last(40), values[-40:])
+        self.assertEqual(t.last(0), [])
+        t.close()
+        self.assertEqual(trail.read(t.filename), values[:t.spilled])
+
+    def testSymbols(self):
+        t = Trail("SS", self.path, 4)
+        values = [("c%d" % (x % 3), u"mål%d" % (x % 5)) for x in range(30)]
+        for x in values:
+            t.append(x)
+        self.assertEqual(list(t), values)
+        t.close()
+        self.assertEqual(trail.read(t.filename), values[:t.spilled])
+
+    def testTooManySymbols(self):
+        t = Trail("S", self.path, 1000)
+        for x in xrange(trail.MAX_SYMBOLS + 1000):
+            t.append(str(x))
+        self.assertRaises(ValueError, t.close)
+
+    def testLastWithoutPath(self):
+        t = Trail("d")
+        self.assertEqual(t.last(1), [])
+        t.append(1.0)
+        self.assertEqual(t.last(0), [])
+        self.assertEqual(t.last(5), [1.0])
+        t.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+#    pyAnimat - Simulate Animats using Transparent Graphs as a way to AGI
+#    Copyright (C) 2017  Nils Svangård, Claes Strannegård
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from animat import trajectory
+
+class Agent:
+    def __init__(self, position, orientation):
+        self.position = position
+        self.orientation = orientation
+
+class TrajectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="animat-test-")
+        self.file = os.path.join(self.path, "trajectory.bin")
+        recorder = trajectory.Recorder(self.file, ["water", "energy"], ["up", "eat", "turn_left"], ["a", "b.1"])
+        recorder.record(1, Agent((0, 1), 0), "up", "a", {"water": -0.5})
+        recorder.record(2, Agent((0, 1), 7), "turn_left", "b.1", {"water": 0.25, "energy": 1.0})
+        recorder.record(3, Agent((0, 1), 7), "eat", "c", {})
+        recorder.record(4, Agent((9, 1), 7), "up", "a", {})
+        recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testRead(self):
+        self.assertEqual(list(trajectory.read(self.file)), [
+            (1, (0, 1), 0, "up", "a", {"water": -0.5}),
+            (2, (0, 1), 7, "turn_left", "b.1", {"water": 0.25, "energy": 1.0}),
+            (3, (0, 1), 7, "eat", None, {}),
+            (4, (9, 1), 7, "up", "a", {})])
+
+    # A crash can leave half a record at the end
+    def testCutOff(self):
+        data = open(self.file, "rb").read()
+        open(self.file, "wb").write(data[:-5])
+        self.assertEqual([x[0] for x in trajectory.read(self.file)], [1, 2, 3])
+
+    def testCSV(self):
+        out = os.path.join(self.path, "trajectory.csv")
+        trajectory.writeCSV(self.file, out)
+        self.assertEqual(open(out).read().splitlines(), [
+            "tick;x;y;orientation;action;cell;water;energy",
+            "1;0;1;0;up;a;-0,5;",
+            "2;0;1;7;turn_left;b.1;0,25;1,0",
+            "3;0;1;7;eat;;;",
+            "4;9;1;7;up;a;;"])
+
+    def testTurtle(self):
+        out = os.path.join(self.path, "playback_script.py")
+        trajectory.writeTurtle(self.file, out)
+        self.assertEqual(open(out).read().splitlines(), [
+            "import turtle;t = turtle.Turtle()",
+            "t.setpos(0,10)",
+            "t.left(90)",
+            "t.color((0,1,0));t.dot(5);t.color((0,0,0))",
+            "t.color((1,0,0));t.dot(3);t.penup()",
+            "t.setpos(90,10)",
+            "t.pendown();t.color((1,1,0));t.dot(3);t.color((0,0,0))"])
+
+if __name__ == "__main__":
+    unittest.main()